@@ -1,31 +1,42 @@
+import os
 import pandas as pd
 import requests
 
-final_results_file = r'data\input-data\0-0-ftu-pmc-total.csv'
+final_results_file = os.path.join('data', 'input-data', '0-0-ftu-pmc-total.csv')
 oa_comm_use_url = 'https://ftp.ncbi.nlm.nih.gov/pub/pmc/oa_comm_use_file_list.csv'
-oa_comm_local_file = r'data\input-data\oa_comm_use_file_list.csv'
-output_file = r'data\input-data\0-1-oa-comm-ftu-pmcid-filepath.csv'
+oa_comm_local_file = os.path.join('data', 'input-data', 'oa_comm_use_file_list.csv')
+output_file = os.path.join('data', 'input-data', '0-1-oa-comm-ftu-pmcid-filepath.csv')
 
-# download oa_comm_use_file_list.csv
+# The OA list has millions of rows; only two of its columns are needed
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+CSV_CHUNK_SIZE = 100000
+OA_COLUMNS = ['File', 'Accession ID']
+
+# download oa_comm_use_file_list.csv, a chunk at a time
 print(f"Downloading {oa_comm_use_url} ...")
-response = requests.get(oa_comm_use_url)
-with open(oa_comm_local_file, 'wb') as f:
-    f.write(response.content)
+with requests.get(oa_comm_use_url, stream=True, timeout=60) as response:
+    response.raise_for_status()
+    with open(oa_comm_local_file + '.part', 'wb') as f:
+        for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+            f.write(chunk)
+os.replace(oa_comm_local_file + '.part', oa_comm_local_file)
 print("Download complete.")
 
 # load data
 final_df = pd.read_csv(final_results_file)
-oa_df = pd.read_csv(oa_comm_local_file)
-
-
-if 'Accession ID' in oa_df.columns:
-    oa_df.rename(columns={'Accession ID': 'pmcid'}, inplace=True)
-
-if 'pmcid' not in final_df.columns or 'pmcid' not in oa_df.columns:
+if 'pmcid' not in final_df.columns:
     raise ValueError("make sure 'pmcid' in both input files")
+targets = set(final_df['pmcid'].astype(str))
+
+# keep only the rows of the target pmcids while reading
+matches = []
+for chunk in pd.read_csv(oa_comm_local_file, usecols=OA_COLUMNS, dtype=str, chunksize=CSV_CHUNK_SIZE):
+    matches.append(chunk[chunk['Accession ID'].isin(targets)])
+oa_df = pd.concat(matches, ignore_index=True).rename(columns={'Accession ID': 'pmcid'})
 
 # merge
+final_df['pmcid'] = final_df['pmcid'].astype(str)
 merged_df = pd.merge(final_df, oa_df, on='pmcid', how='inner')
 merged_df.to_csv(output_file, index=False)
 
-print(f"Finished. Results saved to: {output_file}")
+print(f"Finished. {len(merged_df)} of {len(targets)} pmcids found. Results saved to: {output_file}")
@@ -1,43 +1,279 @@
+#!/usr/bin/env python3
+"""
+Download the PMC OA packages of the FTU articles.
+Packages are fetched over HTTPS by a bounded pool of threads, each reusing one keep-alive
+session. A package is written to <name>.part; after an interruption the download resumes
+from where it stopped with an HTTP Range request. A finished download must have the size the
+server reported (Content-Length / Content-Range) and must decompress to the end without a
+CRC error before it is renamed to <name>.tar.gz, so truncated packages never reach
+3-untar.py. Failed attempts are retried with exponential backoff.
+The status of every package (done, skipped, failed; bytes, attempts, last error) is kept in
+a SQLite ledger next to the packages, so a rerun only fetches what is missing or failed.
+
+With --stream the .tar.gz is never written: the response is piped through a gzip/tar stream
+reader and only the members used downstream (package_members.KEEP_EXTENSIONS: .nxml and
+figure images in the preferred format) are written, into <output-dir>/<pmcid>/ as
+3-untar.py would leave them. Each byte is then written once and the packages never take
+disk space. A package is extracted into a hidden .<pmcid>.partial folder that is renamed
+when the whole stream has been read, so 3-untar.py has nothing left to do. A broken stream
+cannot be resumed and is retried from the start.
+
+    python src/data-fetching/pmc/2-download-pmc-package.py
+    python src/data-fetching/pmc/2-download-pmc-package.py --stream
+    python src/data-fetching/pmc/pmc-mirror-server.py --root mirror --port 8000 &
+    python src/data-fetching/pmc/2-download-pmc-package.py --base-url http://localhost:8000/
+"""
+import argparse
+import gzip
 import os
-import urllib.request
+import shutil
+import sqlite3
+import sys
+import tarfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
 import pandas as pd
-from multiprocessing import Pool
-
-# Set the output directory and base URL for downloading
-output_dir = r"data\input-data\ftu-pub-pmc"
-base_url = "ftp://ftp.ncbi.nlm.nih.gov/pub/pmc/"
-
-# Create the output directory if it doesn't exist
-if not os.path.exists(output_dir):
-    os.makedirs(output_dir)
-
-# Function to download a file for a specific row
-def download_file(row):
-    pmcid = row['pmcid']
-    file_y = row['File']
-    file_url = base_url + file_y
-    
-    # Check if the folder for the given pmcid already exists
-    folder_path = os.path.join(output_dir, pmcid)
-    if not os.path.exists(folder_path):
-        # os.makedirs(folder_path)
-
-        # Download the file
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError as RawReadError
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from package_members import extract_members
+
+CHUNK_SIZE = 1 << 20
+
+
+class CountingReader:
+    """File-like view of a raw response that counts the bytes read through it."""
+
+    def __init__(self, raw, on_read):
+        self.raw = raw
+        self.on_read = on_read
+        self.bytes = 0
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.bytes += len(data)
+        self.on_read(len(data))
+        return data
+
+
+class DownloadLedger:
+    """Status of every package, in SQLite; shared by the download threads."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS downloads ('
+                          'file TEXT PRIMARY KEY, pmcid TEXT, status TEXT, bytes INTEGER, '
+                          'attempts INTEGER, error TEXT, updated TEXT)')
+        self.conn.commit()
+        self._lock = threading.Lock()
+
+    def status(self, file):
+        with self._lock:
+            row = self.conn.execute('SELECT status FROM downloads WHERE file = ?', (file,)).fetchone()
+        return row[0] if row else None
+
+    def record(self, file, pmcid, status, size=0, attempts=0, error=''):
+        with self._lock:
+            self.conn.execute('INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?, ?, ?)',
+                              (file, pmcid, status, size, attempts, error,
+                               datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class Downloader:
+    def __init__(self, base_url, output_dir, ledger, workers=16, retries=5, backoff=2.0, timeout=60,
+                 stream=False):
+        self.base_url = base_url.rstrip('/') + '/'
+        self.output_dir = output_dir
+        self.ledger = ledger
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.stream = stream
+        self.bytes = 0
+        self.written = 0
+        self.retried = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _session(self):
+        # One keep-alive connection pool per thread
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.mount(self.base_url, HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        return session
+
+    def _fetch(self, url, part_path):
+        """Download `url` into `part_path`, resuming a partial file. Returns the full size, if known."""
+        have = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {'Range': f'bytes={have}-'} if have else {}
+        with self._session().get(url, headers=headers, stream=True, timeout=self.timeout) as r:
+            if r.status_code == 416:
+                # Nothing left to fetch: the partial file is already complete
+                return int(r.headers.get('Content-Range', '*/-1').split('/')[-1])
+            r.raise_for_status()
+            if r.status_code == 206:
+                mode, total = 'ab', int(r.headers['Content-Range'].split('/')[-1])
+            else:
+                # The server ignored the range; start over
+                mode, total = 'wb', int(r.headers.get('Content-Length', -1))
+            with open(part_path, mode) as f:
+                for chunk in r.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    with self._lock:
+                        self.bytes += len(chunk)
+                        self.written += len(chunk)
+        return total
+
+    @staticmethod
+    def _verify(part_path, total):
+        size = os.path.getsize(part_path)
+        if total >= 0 and size != total:
+            raise ValueError(f"size {size} != expected {total}")
+        # Reading to the end checks the gzip CRC and length trailer
+        with gzip.open(part_path, 'rb') as f:
+            while f.read(CHUNK_SIZE):
+                pass
+        return size
+
+    def _count(self, n):
+        with self._lock:
+            self.bytes += n
+
+    def _fetch_package(self, url, file_path, pmcid):
+        """Download and verify one package as <name>.tar.gz. Returns its size."""
+        part_path = file_path + '.part'
+        total = self._fetch(url, part_path)
+        try:
+            size = self._verify(part_path, total)
+        except (OSError, EOFError, ValueError):
+            # A corrupt partial file cannot be resumed
+            os.remove(part_path)
+            raise
+        os.replace(part_path, file_path)
+        print(f"Download completed: {file_path}")
+        return size
+
+    def _stream_package(self, url, file_path, pmcid):
+        """Extract the wanted members of one package straight from the response. Returns its size."""
+        partial_dir = os.path.join(self.output_dir, f'.{pmcid}.partial')
+        shutil.rmtree(partial_dir, ignore_errors=True)
         try:
-            print(f"Downloading {file_url} to {folder_path}")
-            file_path = os.path.join(output_dir, file_y.split('/')[-1])
-            urllib.request.urlretrieve(file_url, file_path)
-            print(f"Download completed: {file_path}")
-        except Exception as e:
-            print(f"Failed to download {file_url}: {e}")
-    else:
-        print(f"Folder {folder_path} exists. Skipping download.")
-
-# Read the CSV file using pandas
-df = pd.read_csv(r'data\input-data\0-1-oa-comm-ftu-pmcid-filepath.csv')
-
-# Create a pool of worker processes to download files in parallel
+            with self._session().get(url, stream=True, timeout=self.timeout) as r:
+                r.raise_for_status()
+                total = int(r.headers.get('Content-Length', -1))
+                # The .tar.gz bytes as sent; the tar reader does the decompression
+                r.raw.decode_content = False
+                reader = CountingReader(r.raw, self._count)
+                try:
+                    stats = extract_members(reader, partial_dir)
+                    # The tar end marker can come before the end of the gzip stream
+                    while reader.read(CHUNK_SIZE):
+                        pass
+                except (tarfile.TarError, zlib.error) as e:
+                    raise ValueError(f"corrupt package: {e}") from e
+                except RawReadError as e:
+                    # A broken connection while reading the body, as iter_content would report it
+                    raise requests.ConnectionError(e) from e
+            if total >= 0 and reader.bytes != total:
+                raise ValueError(f"size {reader.bytes} != expected {total}")
+            for error in stats['errors']:
+                print(f"{url}: {error}")
+            # Members are stored under <pmcid>/; move them into place only when complete
+            if os.path.isdir(partial_dir):
+                for entry in os.listdir(partial_dir):
+                    os.replace(os.path.join(partial_dir, entry), os.path.join(self.output_dir, entry))
+        finally:
+            shutil.rmtree(partial_dir, ignore_errors=True)
+        with self._lock:
+            self.written += stats['bytes']
+        print(f"Extracted {stats['kept']} of {stats['members']} members: {url}")
+        return reader.bytes
+
+    def download(self, pmcid, file):
+        """Fetch one package; returns its ledger status."""
+        name = file.split('/')[-1]
+        file_path = os.path.join(self.output_dir, name)
+        if os.path.isdir(os.path.join(self.output_dir, pmcid)):
+            self.ledger.record(file, pmcid, 'skipped', error='already extracted')
+            return 'skipped'
+        status = self.ledger.status(file)
+        if status == 'done' and os.path.isfile(file_path) or status == 'extracted' and self.stream:
+            return 'skipped'
+
+        url = self.base_url + file
+        fetch, status = (self._stream_package, 'extracted') if self.stream else (self._fetch_package, 'done')
+        error = ''
+        for attempt in range(1, self.retries + 1):
+            try:
+                size = fetch(url, file_path, pmcid)
+                self.ledger.record(file, pmcid, status, size, attempt)
+                return 'done'
+            except (requests.RequestException, OSError, EOFError, ValueError) as e:
+                error = str(e)
+                code = getattr(getattr(e, 'response', None), 'status_code', None)
+                if code and 400 <= code < 500 and code not in (408, 429):
+                    # Missing or forbidden: retrying will not help
+                    break
+                if attempt < self.retries:
+                    wait = self.backoff ** attempt
+                    print(f"Failed to download {url} ({e}), retrying in {wait:.0f}s...")
+                    with self._lock:
+                        self.retried += 1
+                    time.sleep(wait)
+        print(f"Failed to download {url}: {error}")
+        self.ledger.record(file, pmcid, 'failed', attempts=attempt, error=error)
+        return 'failed'
+
+    def run(self, packages):
+        """Download (pmcid, file) pairs with `workers` concurrent threads."""
+        counts = {'done': 0, 'skipped': 0, 'failed': 0}
+        start = time.time()
+        with ThreadPoolExecutor(self.workers) as pool:
+            jobs = [pool.submit(self.download, pmcid, file) for pmcid, file in packages]
+            for job in as_completed(jobs):
+                counts[job.result()] += 1
+        elapsed = time.time() - start
+        print(f"{counts['done']} downloaded, {counts['skipped']} skipped, {counts['failed']} failed, "
+              f"{self.retried} retries; {self.bytes / 1e6:.1f} MB in {elapsed:.1f}s "
+              f"({self.bytes / 1e6 / elapsed if elapsed else 0:.2f} MB/s), {self.written / 1e6:.1f} MB written")
+        return counts
+
+
+def main(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    df = pd.read_csv(args.file_list, usecols=['pmcid', 'File'], dtype=str)
+    ledger = DownloadLedger(args.ledger or os.path.join(args.output_dir, 'download_ledger.sqlite'))
+    downloader = Downloader(args.base_url, args.output_dir, ledger, workers=args.workers,
+                            retries=args.retries, backoff=args.backoff, timeout=args.timeout,
+                            stream=args.stream)
+    downloader.run(zip(df['pmcid'], df['File']))
+    ledger.close()
+
+
 if __name__ == '__main__':
-    # Use a pool of processes to execute the download_file function in parallel
-    with Pool(processes=30) as pool:  
-        pool.map(download_file, [row for index, row in df.iterrows()])
+    parser = argparse.ArgumentParser(description='Download PMC OA packages with resume and integrity checks')
+    parser.add_argument('--file-list', default=os.path.join('data', 'input-data', '0-1-oa-comm-ftu-pmcid-filepath.csv'))
+    parser.add_argument('--output-dir', default=os.path.join('data', 'input-data', 'ftu-pub-pmc'))
+    parser.add_argument('--base-url', default='https://ftp.ncbi.nlm.nih.gov/pub/pmc/',
+                        help='PMC mirror root; a local pmc-mirror-server.py for tests')
+    parser.add_argument('--ledger', help='Status database (default: <output-dir>/download_ledger.sqlite)')
+    parser.add_argument('--workers', type=int, default=16, help='Concurrent downloads')
+    parser.add_argument('--retries', type=int, default=5)
+    parser.add_argument('--backoff', type=float, default=2.0, help='Retry wait is backoff ** attempt seconds')
+    parser.add_argument('--timeout', type=float, default=60, help='Connect/read timeout in seconds')
+    parser.add_argument('--stream', action='store_true',
+                        help='Extract the used members while downloading instead of saving the .tar.gz')
+    main(parser.parse_args())
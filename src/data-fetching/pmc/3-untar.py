@@ -1,63 +1,73 @@
 import os
+import gzip
+import sys
+import time
+import zlib
 import tarfile
 import pandas as pd
-import zlib
 from multiprocessing import Pool
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from package_members import extract_members
+
+# ISA-L inflates gzip several times faster than zlib; the standard gzip module otherwise
+try:
+    from isal import igzip as gzip_backend
+except ImportError:
+    gzip_backend = gzip
+
 # Input and output directories
-input_dir = r"data\input-data\ftu-pub-pmc" 
-error_log_file = "data\input-data\error_files-new.csv" 
+input_dir = os.path.join("data", "input-data", "ftu-pub-pmc")
+error_log_file = os.path.join("data", "input-data", "error_files-new.csv")
 
-# List to store error file details
-error_files = []
+CHUNK_SIZE = 1 << 20
 
 # Function to extract .tar.gz files
 def extract_tar_gz(file_path_target):
     """
-    Extract a .tar.gz file to the specified target directory.
+    Extract the members used downstream (package_members.KEEP_EXTENSIONS) of a .tar.gz file
+    to the specified target directory, and delete the archive once it has been read completely.
     Handles empty files, corrupted files, and other extraction errors.
+    Returns the archive's stats and errors, as the workers cannot share a list with the parent.
     """
     file_path, target_dir = file_path_target
+    result = {'File': file_path, 'members': 0, 'kept': 0, 'bytes': 0, 'seconds': 0.0, 'errors': []}
 
-    if not file_path.endswith('.tar.gz'):
-        return
-    
     # Skip empty files
     if os.path.getsize(file_path) == 0:
         print(f"[Empty File] {file_path} - Skipped extraction.")
-        error_files.append({'File': file_path, 'Error': 'Empty file'})
+        result['errors'].append({'File': file_path, 'Error': 'Empty file'})
         os.remove(file_path)  # Remove empty file
         print(f"{file_path} has been deleted.")
-        return
+        return result
 
-    print(f"Extracting {file_path}...")
+    start = time.time()
     try:
-        # Open tar.gz file and extract members one by one
-        with tarfile.open(file_path, 'r:gz') as tar:
-            for member in tar.getmembers():
-                try:
-                    tar.extract(member, path=target_dir)
-                except IOError as e:
-                    print(f"Failed to extract {member.name}: {e}")
-                    error_files.append({'File': file_path, 'Error': f"Failed to extract {member.name}: {e}"})
-        print(f"{file_path} extraction complete.")
+        # Decompress once, front to back, writing only the wanted members
+        with gzip_backend.open(file_path, 'rb') as gz:
+            stats = extract_members(gz, target_dir, mode='r|')
+            # Reading to the end checks the gzip CRC and length trailer
+            while gz.read(CHUNK_SIZE):
+                pass
+        result.update(members=stats['members'], kept=stats['kept'], bytes=stats['bytes'])
+        result['errors'] += [{'File': file_path, 'Error': error} for error in stats['errors']]
 
         # Delete the .tar.gz file after successful extraction
         os.remove(file_path)
-        print(f"{file_path} has been deleted.")
-
     except tarfile.ReadError as e:
         print(f"[Error] Failed to extract {file_path}: {e}")
-        error_files.append({'File': file_path, 'Error': str(e)})
+        result['errors'].append({'File': file_path, 'Error': str(e)})
     except EOFError as e:
         print(f"[EOF Error] {file_path} is incomplete: {e}")
-        error_files.append({'File': file_path, 'Error': 'EOFError - File ended prematurely'})
-    except zlib.error as e:
+        result['errors'].append({'File': file_path, 'Error': 'EOFError - File ended prematurely'})
+    except (zlib.error, gzip.BadGzipFile) as e:
         print(f"[Compression Error] Failed to extract {file_path}: {e}")
-        error_files.append({'File': file_path, 'Error': 'zlib error - Invalid compressed file'})
+        result['errors'].append({'File': file_path, 'Error': 'zlib error - Invalid compressed file'})
     except Exception as e:
         print(f"[Unknown Error] Failed to extract {file_path}: {e}")
-        error_files.append({'File': file_path, 'Error': str(e)})
+        result['errors'].append({'File': file_path, 'Error': str(e)})
+    result['seconds'] = time.time() - start
+    return result
 
 # Function to traverse directories and process .tar.gz files
 def traverse_and_extract(root_dir):
@@ -65,25 +75,36 @@ def traverse_and_extract(root_dir):
     Traverse the root directory and its subdirectories to process .tar.gz files.
     """
     tasks = []
-    for root, _, files in os.walk(root_dir):  
+    for root, _, files in os.walk(root_dir):
         for file_name in files:
             full_file_path = os.path.join(root, file_name)
             if file_name.endswith('.tar.gz'):
-                tasks.append((full_file_path, root))  
+                tasks.append((full_file_path, root))
 
     return tasks
 
 if __name__ == "__main__":
-    print("Starting extraction of all .tar.gz files...")
-    
+    print(f"Starting extraction of all .tar.gz files (gzip backend: {gzip_backend.__name__})...")
+    start = time.time()
+
     # Gather tasks
     tasks = traverse_and_extract(input_dir)
 
-    # Use multiprocessing to process tasks
+    # Use multiprocessing to process tasks; each result carries its archive's errors
+    error_files = []
+    totals = {'archives': 0, 'members': 0, 'kept': 0, 'bytes': 0}
     with Pool(processes=os.cpu_count()) as pool:
-        pool.map(extract_tar_gz, tasks)
+        for result in pool.imap_unordered(extract_tar_gz, tasks, chunksize=4):
+            error_files += result['errors']
+            totals['archives'] += 1
+            for key in ('members', 'kept', 'bytes'):
+                totals[key] += result[key]
+            print(f"{result['File']}: kept {result['kept']} of {result['members']} members "
+                  f"in {result['seconds']:.2f}s")
 
-    print("Extraction process complete.")
+    elapsed = time.time() - start
+    print(f"Extraction process complete: {totals['archives']} archives, kept {totals['kept']} of "
+          f"{totals['members']} members, {totals['bytes'] / 1e6:.1f} MB written in {elapsed:.1f}s.")
 
     # Save error details to a CSV file
     if error_files:
@@ -92,4 +113,3 @@ if __name__ == "__main__":
         print(f"Error files have been saved to {error_log_file}.")
     else:
         print("No errors encountered during extraction.")
-
@@ -1,414 +1,209 @@
-import json
+import hashlib
 import os
-import re
+import sys
+from collections import deque
 
 import pandas as pd
-from multiprocessing import Pool
-
-from bs4 import BeautifulSoup
-from clickhouse_driver import Client
-
-ch_host = 'your_ch_host'
-database = 'hra_rag_ftu'
-# Initialize the global client
-client = Client(
-    host=ch_host,
-    port=9000,
-    user='your_username',
-    password='your_password',
-    database=database
-)
-
-
-def insert_ftu_pub_pmc(batch_data):
-    # Format the data into a list of tuples
-    records = [
-        (row['pmcid'], row['figid'], row['label'], row['graphic'], row['caption'], row['file_path'])
-        for _, row in batch_data.iterrows()
-    ]
-
-    insert_query = """
-        INSERT INTO ftu_pub_pmc (pmcid, figid, label, graphic, caption, file_path) 
-        VALUES
-    """
+from multiprocessing import Event, Pool
+from multiprocessing.util import Finalize
 
-    client.execute(insert_query, records)
-    print(f"Finished inserting {len(records)} records.")
+# Shared storage backends live with the LLM runners in src/lm-rag
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lm-rag'))
+from batch_writer import BatchWriter
+from ch_stream import batched
+from pipeline import Progress
+from storage import open_storage_from_env
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from nxml_extract import COLUMNS, EXTRACTOR_VERSION, article_pmcid, article_record, table_rows
 
-def create_tables():
-    create_table_query = """
-        CREATE TABLE IF NOT EXISTS ftu_pub_pmc (
-            pmcid String,
-            figid String,
-            label String,
-            graphic String,
-            caption String,
-            ref_text String,
-            file_path String
-        ) ENGINE = MergeTree()
-        ORDER BY pmcid;
-    """
-    client.execute(create_table_query)
-
-    create_table_query = """
-        CREATE TABLE IF NOT EXISTS publication_summary (
-            pmcid String,
-            article_title String,
-            pmid String,
-            doi String,
-            abstract String,
-            pub_year String,
-            journal_title String,
-            file_path String
-        ) ENGINE = MergeTree()
-        ORDER BY pmcid;
-    """
-    client.execute(create_table_query)
-
-    create_table_query = """
-            CREATE TABLE IF NOT EXISTS publication_subject (
-                pmcid String,
-                subject String,
-                group_type String,
-
-                file_path String
-            ) ENGINE = MergeTree()
-            ORDER BY pmcid;
-        """
-    client.execute(create_table_query)
-
-    create_table_query = """
-            CREATE TABLE IF NOT EXISTS publication_authors (
-                pmcid String,
-                surname String,
-                given_names String,
-                email String,
-                file_path String
-            ) ENGINE = MergeTree()
-            ORDER BY pmcid;
-        """
-    client.execute(create_table_query)
-
-    create_table_query = """
-            CREATE TABLE IF NOT EXISTS image_refs (
-                pmcid String,
-                rid String,
-                ref_type String,
-                ref_xml String,
-                ref_text String,
-                file_path String
-            ) ENGINE = MergeTree()
-            ORDER BY pmcid;
-        """
-    client.execute(create_table_query)
-
-    create_table_query = """
-CREATE TABLE IF NOT EXISTS img_fulltext
-(
-    pmcid String,
-    pid String,
-    ref_xml String,
-    ref_text String,
-    version DateTime DEFAULT now(), 
-    PRIMARY KEY (pmcid, pid)
-) 
-ENGINE = ReplacingMergeTree(version)
-ORDER BY (pmcid, pid);
-
-        """
-    client.execute(create_table_query)
+try:
+    from article_cache import ArticleCache
+except ImportError:
+    # msgpack not installed: every article is parsed from its XML
+    ArticleCache = None
 
-    print("Tables created successfully.")
+store = open_storage_from_env()
 
+# Parsing is CPU-bound: one worker per core, a few articles per task, large insert batches
+WORKERS = os.cpu_count()
+CHUNKSIZE = 8
+BATCH_SIZE = 5000
+# Chunks queued to the pool at a time, so parsed rows never pile up ahead of the writers
+MAX_PENDING_CHUNKS = 4 * WORKERS
 
-def get_publication_summary(file_path):
-    pmcid = os.path.basename(os.path.dirname(file_path))
-    with open(file_path, 'r', encoding='utf-8') as file:
-        xml_content = file.read()
+# Parsed articles, reused while the .nxml is unchanged; None turns the cache off
+CACHE_DIR = os.path.join('data', 'input-data', 'ftu-pub-pmc-cache')
+cache = ArticleCache(CACHE_DIR) if ArticleCache and CACHE_DIR else None
 
-    soup = BeautifulSoup(xml_content, features="lxml-xml")
+# One row per ingested article file: the hash and extractor version its rows came from
+LEDGER = 'pmc_ingest_ledger'
+LEDGER_COLUMNS = ['pmcid', 'file_path', 'file_hash', 'extractor_version']
 
 
-    article_title = soup.find('title-group').find("article-title").text if soup.find('title-group') and soup.find(
-        'title-group').find("article-title") else ""
-    pmid = soup.find("article-id", {"pub-id-type": "pmid"}).text if soup.find("article-id",
-                                                                              {"pub-id-type": "pmid"}) else ""
-    doi = soup.find("article-id", {"pub-id-type": "doi"}).text if soup.find("article-id",
-                                                                            {"pub-id-type": "doi"}) else ""
-    # abstract = soup.find("abstract", {"abstract-type": "toc"}).text.strip() if soup.find("abstract", {"abstract-type": "toc"}) else ""
-    abstract = str(soup.find("abstract")) if soup.find("abstract") else ""
-
+def create_tables():
+    store.create_table('ftu_pub_pmc', {
+        'pmcid': 'String',
+        'figid': 'String',
+        'label': 'String',
+        'graphic': 'String',
+        'caption': 'String',
+        'ref_text': 'String',
+        'file_path': 'String',
+    }, order_by=['pmcid'])
+
+    store.create_table('publication_summary', {
+        'pmcid': 'String',
+        'article_title': 'String',
+        'pmid': 'String',
+        'doi': 'String',
+        'abstract': 'String',
+        'pub_year': 'String',
+        'journal_title': 'String',
+        'file_path': 'String',
+    }, order_by=['pmcid'])
+
+    store.create_table('publication_subject', {
+        'pmcid': 'String',
+        'subject': 'String',
+        'group_type': 'String',
+        'file_path': 'String',
+    }, order_by=['pmcid'])
+
+    store.create_table('publication_authors', {
+        'pmcid': 'String',
+        'surname': 'String',
+        'given_names': 'String',
+        'email': 'String',
+        'file_path': 'String',
+    }, order_by=['pmcid'])
+
+    store.create_table('image_refs', {
+        'pmcid': 'String',
+        'rid': 'String',
+        'ref_type': 'String',
+        'ref_xml': 'String',
+        'ref_text': 'String',
+        'file_path': 'String',
+    }, order_by=['pmcid'])
+
+    store.create_table('img_fulltext', {
+        'pmcid': 'String',
+        'pid': 'String',
+        'ref_xml': 'String',
+        'ref_text': 'String',
+        'version': 'DateTime DEFAULT now()',
+    }, order_by=['pmcid', 'pid'], version='version')
+
+    store.create_table(LEDGER, {
+        'pmcid': 'String',
+        'file_path': 'String',
+        'file_hash': 'String',
+        'extractor_version': 'String',
+        'ingested_at': 'DateTime DEFAULT now()',
+    }, order_by=['pmcid', 'file_path'], version='ingested_at')
 
-    pub_types = ["ppub", "epub", "pmc-release"]
-    pub_year = ""
+    print("Tables created successfully.")
 
-    for pub_type in pub_types:
-        pub_date = soup.find("pub-date", {"pub-type": pub_type})
-        if pub_date and pub_date.find("year"):
-            pub_year = pub_date.find("year").text
-            break
 
-    journal_title = soup.find("journal-title").text if soup.find("journal-title") else ""
+# image_refs writer of a pool worker, opened once by init_worker, and the run's flag for
+# image_refs that could not be written
+worker_refs = None
+refs_failed = None
 
-    extracted_data = {
-        "pmcid": pmcid,
-        "article_title": article_title,
-        "pmid": pmid,
-        "doi": doi,
-        "abstract": abstract,
-        "pub_year": pub_year,
-        "journal_title": journal_title,
-        "file_path": file_path,
-    }
-    # print(extracted_data)
-    return [extracted_data]
 
+def init_worker(failed):
+    """Pool initializer: one connection per worker, with image_refs buffered across articles."""
+    global worker_refs, refs_failed
+    refs_failed = failed
+    worker_store = open_storage_from_env()
+    worker_refs = BatchWriter(worker_store, 'image_refs', COLUMNS['image_refs'], batch_size=BATCH_SIZE)
+    # Runs when the worker exits after pool.close()/join(), so the last partial batch is kept
+    Finalize(None, close_worker, args=(worker_refs, worker_store, failed), exitpriority=10)
 
-def get_xref_info(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        xml_content = file.read()
-    pmcid = os.path.basename(os.path.dirname(file_path))
-    xref_list = []
 
+def close_worker(writer, worker_store, failed):
     try:
-        soup = BeautifulSoup(xml_content, features="lxml-xml")
-        p_results = soup.find_all('p')
-        for p in p_results:
-            xref_rs = p.find_all('xref')
-            if xref_rs:
-                for xref in xref_rs:
-                    ref_type = xref.get('ref-type','')  
-                    rid = xref.get('rid','')  
-
-                    xref_list.append(
-                        {
-                            'rid': rid,
-                            'ref_type': ref_type,
-                            'ref_xml': str(p),
-                            'ref_text': p.text,
-                            'pmcid': pmcid,
-                            'file_path': file_path
-                        }
-                    )
-
-        if xref_list:
-            insert_image_refs(xref_list)
-        # return f"Success: {file_path}"
+        writer.close()
     except Exception as e:
-        print( f"Error processing {file_path}: {e}")
+        print(f"Database insert failed: {e}")
+        failed.set()
+    worker_store.close()
 
-def insert_image_refs(records):
+
+def extract_file(task):
+    """
+    Rows of every table for one article, from its cached record when the file is unchanged.
+    image_refs are buffered by the worker's own writer.
+    """
+    file_path, file_hash = task
+    try:
+        record = cache.get(file_path, file_hash) if cache else None
+        if record is None:
+            record = article_record(file_path)
+            if cache:
+                cache.put(record, file_hash)
+        rows = table_rows(record)
+    except Exception as e:
+        print(f"Error processing {file_path}: {e}")
+        return file_path, {}
     try:
-        client = Client(
-            host=ch_host,
-            port=9000,
-            user='default',
-            password='kyx321',
-            database=database
-        )
-        
-        insert_query = """
-                INSERT INTO image_refs (pmcid, rid, ref_type, ref_xml, ref_text, file_path) 
-                VALUES
-            """
-        
-        record_values = [
-            (record['pmcid'], record['rid'], record['ref_type'], record['ref_xml'], record['ref_text'],
-             record['file_path'])
-            for record in records
-        ]
-        
-        client.execute(insert_query, record_values)
+        worker_refs.add_many(rows.pop('image_refs'))
     except Exception as e:
+        # The buffered references of several articles may be lost; the parent sees the flag
         print(f"Database insert failed: {e}")
+        refs_failed.set()
+    return file_path, rows
 
 
-def process_image_refs(file_paths):
-    with Pool(50) as pool:
-        results = pool.map(get_xref_info, file_paths)
-
-    print("Publication summary processing completed.")
-
-
-def get_publication_authors(file_path):
-    pmcid = os.path.basename(os.path.dirname(file_path))
-    with open(file_path, 'r', encoding='utf-8') as file:
-        xml_content = file.read()
-
-    soup = BeautifulSoup(xml_content, features="lxml-xml")
+def extract_files(tasks):
+    return [extract_file(task) for task in tasks]
 
-    
-    authors = []
-    contribs = soup.find_all('contrib')
 
-    for contrib in contribs:
-        
-        name_tag = contrib.find('name')
-        if name_tag:
-            surname = name_tag.find('surname').text if name_tag.find('surname') else ''
-            given_names = name_tag.find('given-names').text if name_tag.find('given-names') else ''
-        else:
-            surname = ''
-            given_names = ''
+def hash_file(file_path):
+    with open(file_path, 'rb') as f:
+        return file_path, hashlib.sha1(f.read()).hexdigest()
 
-        
-        email = contrib.find('email').text if contrib.find('email') else ''
 
-        
-        author_info = {
-            'surname': surname,
-            'given_names': given_names,
-            'email': email,
-            'pmcid': pmcid,
-            'file_path': file_path,
-        }
-
-        authors.append(author_info)
-    return authors
-
-
-def insert_publication_authors(batch_data):
-    records = [
-        (
-            row['pmcid'], row['surname'], row['given_names'], row['email'], row['file_path']
-        )
-        for _, row in batch_data.iterrows()
-    ]
-
-    insert_query = """
-        INSERT INTO publication_authors (pmcid, surname, given_names,email, file_path) 
-        VALUES
+def plan_ingestion(file_paths):
     """
-
-    client.execute(insert_query, records)
-    print(f"Finished inserting {len(records)} records.")
-
-
-def get_publication_subject(file_path):
-    pmcid = os.path.basename(os.path.dirname(file_path))
-    with open(file_path, 'r', encoding='utf-8') as file:
-        xml_content = file.read()
-
-    soup = BeautifulSoup(xml_content, features="lxml-xml")
-    # Adjusted function to ensure correct handling of XML structure
-    def extract_subjects_fixed(subj_group, subj_type):
-        """Recursive extraction of subject content with corrected structure."""
-        results = []
-        # Direct subjects within the current subj-group
-        direct_subjects = subj_group.find_all("subject", recursive=False)
-        for subject in direct_subjects:
-            results.append((subj_type, subject.get_text(strip=True)))
-
-        # Child subj-groups within the current subj-group
-        child_groups = subj_group.find_all("subj-group", recursive=False)
-        for child_group in child_groups:
-            results.extend(extract_subjects_fixed(child_group, subj_type))
-
-        return results
-
-    results = []
-    subjects = []
-    for top_subj_group in soup.find_all("subj-group", attrs={"subj-group-type": True}, recursive=True):
-        subj_type = top_subj_group["subj-group-type"]
-        results.extend(extract_subjects_fixed(top_subj_group, subj_type))
-
-    
-    unique_results = list(set(results))
-
-    for subj_type, subject in unique_results:
-        subjects.append({
-            "group_type": subj_type,
-            "subject": subject,
-            'pmcid': pmcid,
-            'file_path': file_path,
-        })
-    return subjects
-
-
-def insert_publication_subject(batch_data):
-    records = [
-        (
-            row['pmcid'], row['group_type'], row['subject'], row['file_path']
-        )
-        for _, row in batch_data.iterrows()
-    ]
-
-    insert_query = """
-        INSERT INTO publication_subject (pmcid, group_type, subject, file_path) 
-        VALUES
-    """
-
-    client.execute(insert_query, records)
-    print(f"Finished inserting {len(records)} records.")
-
-
-def insert_publication_summary(batch_data):
-    records = [
-        (
-            row['pmcid'], row['article_title'], row['pmid'], row['doi'], row['abstract'], row['pub_year'],
-            row['journal_title'], row['file_path']
-        )
-        for _, row in batch_data.iterrows()
-    ]
-
-    insert_query = """
-        INSERT INTO publication_summary (pmcid, article_title, pmid, doi, abstract, pub_year, journal_title,file_path) 
-        VALUES
+    Compare the articles on disk with the ledger.
+    Returns the files to extract, their hashes and the pmcids whose existing rows are stale.
+    An article is skipped when the ledger has each of its files with the same hash and
+    extractor version; otherwise all of its files are extracted again.
     """
-
-    client.execute(insert_query, records)
-    print(f"Finished inserting {len(records)} records.")
-
-
-def get_fig_info(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        xml_content = file.read()
-
-    soup = BeautifulSoup(xml_content, features="lxml-xml")
-
-    fig_results = soup.find_all("fig")
-    data = []
-
-    if fig_results:
-        for fig in fig_results:
-            pmcid = os.path.basename(os.path.dirname(file_path))
-            figid = fig.get("id", "")
-            label = fig.find("label").get_text(strip=True) if fig.find("label") else ""
-            graphic_elem = fig.find("graphic")
-            graphic = graphic_elem["xlink:href"] if graphic_elem and "xlink:href" in graphic_elem.attrs else ""
-
-            caption_elem = fig.find("caption")
-            caption = caption_elem.get_text(separator=" ", strip=True) if caption_elem else ""
-
-            data.append({
-                "pmcid": pmcid,
-                "figid": figid,
-                "label": label,
-                "graphic": graphic,
-                "caption": caption,
-                "file_path":file_path
-            })
-
-    else:
-        data.append({
-            "pmcid": '',
-            "file_path": file_path,
-            "figid": '',
-            "label": '',
-            "graphic": '',
-            "caption": '',
-        })
-    return data
+    with Pool(WORKERS) as pool:
+        hashes = dict(pool.imap_unordered(hash_file, file_paths, chunksize=64))
+    ledger = {(row['pmcid'], row['file_path']): (row['file_hash'], row['extractor_version'])
+              for row in store.select(LEDGER, LEDGER_COLUMNS)}
+    changed = {article_pmcid(path) for path, file_hash in hashes.items()
+               if ledger.get((article_pmcid(path), path)) != (file_hash, EXTRACTOR_VERSION)}
+
+    # Rows already stored for these articles: from an earlier version, or from a run that was
+    # interrupted before their ledger entries were written
+    stored = {pmcid for pmcid, _ in ledger}
+    for table in COLUMNS:
+        stored.update(pmcid for pmcid, in store.stream(f"SELECT DISTINCT pmcid FROM {store.name(table)}"))
+    return [path for path in file_paths if article_pmcid(path) in changed], hashes, changed & stored
+
+
+def delete_stale(stale, file_paths):
+    """Remove the rows of articles that are extracted again, before any of them is re-inserted."""
+    stale_paths = [path for path in file_paths if article_pmcid(path) in stale]
+    for table, columns in COLUMNS.items():
+        matches = {'pmcid': stale}
+        # ftu_pub_pmc rows of articles without figures have an empty pmcid
+        if 'file_path' in columns:
+            matches['file_path'] = stale_paths
+        store.delete(table, matches)
+    print(f"Deleted the rows of {len(stale)} changed articles.")
 
 
 def process_nxml_files_in_directory(root_dir):
     output_file = "nxml_total.csv"
 
-    if os.path.exists(output_file):
-        print(f"{output_file} already exists. Skipping directory processing.")
-        return pd.read_csv(output_file)['file_path'].tolist()
-
+    # Always rescanned, so articles added since the last run are found; the ledger decides
+    # which of them need extracting
     file_paths = []
     for dirpath, dirnames, filenames in os.walk(root_dir):
         for file in filenames:
@@ -425,141 +220,63 @@ def process_nxml_files_in_directory(root_dir):
     return file_paths
 
 
-def process_ftu(file_paths):
-    with Pool(200) as pool:
-        results = pool.map(get_fig_info, file_paths)
-
-    all_data = [item for sublist in results for item in sublist]
-    df = pd.DataFrame(all_data)
-
-    batch_size = 1000
-    for start in range(0, len(df), batch_size):
-        batch_data = df.iloc[start:start + batch_size]
-        insert_ftu_pub_pmc(batch_data)
-    print("FTU processing completed.")
-
-
-def process_publication_summary(file_paths):
-    with Pool(500) as pool:
-        results = pool.map(get_publication_summary, file_paths)
-
-    all_data = [item for sublist in results for item in sublist]
-    df = pd.DataFrame(all_data)
-
-    batch_size = 1000
-    for start in range(0, len(df), batch_size):
-        batch_data = df.iloc[start:start + batch_size]
-        insert_publication_summary(batch_data)
-    print("Publication summary processing completed.")
-
-
-def process_publication_subject(file_paths):
-    with Pool(500) as pool:
-        results = pool.map(get_publication_subject, file_paths)
-
-    all_data = [item for sublist in results for item in sublist]
-    df = pd.DataFrame(all_data)
-
-    batch_size = 1000
-    for start in range(0, len(df), batch_size):
-        batch_data = df.iloc[start:start + batch_size]
-        insert_publication_subject(batch_data)
-    print("Publication summary processing completed.")
-
-
-def process_publication_authors(file_paths):
-    with Pool(500) as pool:
-        results = pool.map(get_publication_authors, file_paths)
-
-    all_data = [item for sublist in results for item in sublist]
-    df = pd.DataFrame(all_data)
-
-    batch_size = 1000
-    for start in range(0, len(df), batch_size):
-        batch_data = df.iloc[start:start + batch_size]
-        insert_publication_authors(batch_data)
-    print("Publication summary processing completed.")
-
-
-def process_img_fulltext(file_paths):
-    with Pool(500) as pool:
-        results = pool.map(get_img_fulltext, file_paths)
-
-    all_data = [item for sublist in results for item in sublist]
-    df = pd.DataFrame(all_data)
-
-    batch_size = 1000
-    for start in range(0, len(df), batch_size):
-        batch_data = df.iloc[start:start + batch_size]
-        insert_img_fulltext(batch_data)
-    print("Publication summary processing completed.")
-
-
-def get_img_fulltext(file_path):
-    pmcid = os.path.basename(os.path.dirname(file_path))
-    with open(file_path, 'r', encoding='utf-8') as file:
-        xml_content = file.read()
-    results = []
-
-    soup = BeautifulSoup(xml_content, features="lxml-xml")
-
-
-    body_tag = soup.find("body")
-    if  body_tag==None:
-        results.append({
-            "pid": '',
-            "pmcid": pmcid,
-            "ref_xml": '',
-            "ref_text": ''
-        })
-        return results
-
-
-    p_tags = body_tag.find_all("p")
-
-
-
-    for p in p_tags:
-        pid = p.get("id")
-        if pid and pid.startswith("Par"):
-            ref_xml = str(p)  
-            ref_text = p.get_text(strip=True)  
-            results.append({
-                "pid": pid,
-                "pmcid": pmcid,
-                "ref_xml": ref_xml,
-                "ref_text": ref_text
-            })
-    return results
-
-
-def insert_img_fulltext(batch_data):
-    records = [
-        (
-            row['pmcid'], row['pid'], row['ref_xml'], row['ref_text']
-        )
-        for _, row in batch_data.iterrows()
-    ]
-
-    insert_query = """
-        INSERT INTO img_fulltext (pmcid, pid, ref_xml,ref_text) 
-        VALUES
+def process_articles(file_paths, hashes):
     """
-
-    client.execute(insert_query, records)
-    print(f"Finished inserting {len(records)} records.")
+    Parse every article once and fill all metadata tables from that parse.
+    Articles are queued to the workers CHUNKSIZE at a time, at most MAX_PENDING_CHUNKS ahead of
+    the oldest unfinished chunk, and their rows go straight into one BatchWriter per table, so
+    inserts start with the first articles and memory stays bounded by the window and the batches.
+    image_refs, the largest table, is written by the workers over their own connections.
+    Ledger entries are written last, once all rows of the run are in, so an interrupted run
+    leaves its articles to be extracted again. A worker's image_refs batch holds references of
+    many articles, so when one cannot be written no ledger entry is written for the run.
+    """
+    tables = [table for table in COLUMNS if table != 'image_refs']
+    writers = {table: BatchWriter(store, table, COLUMNS[table], batch_size=BATCH_SIZE) for table in tables}
+    progress = Progress(total=len(file_paths), desc='Articles')
+    ingested = []
+    failed = Event()
+
+    def collect(results):
+        for file_path, rows in results:
+            for table, table_rows in rows.items():
+                writers[table].add_many(table_rows)
+            if rows:
+                ingested.append((article_pmcid(file_path), file_path, hashes[file_path], EXTRACTOR_VERSION))
+            progress.update(ok=bool(rows))
+
+    with Pool(WORKERS, initializer=init_worker, initargs=(failed,)) as pool:
+        tasks = ((file_path, hashes[file_path]) for file_path in file_paths)
+        pending = deque()
+        for chunk in batched(tasks, CHUNKSIZE):
+            pending.append(pool.apply_async(extract_files, (chunk,)))
+            if len(pending) >= MAX_PENDING_CHUNKS:
+                collect(pending.popleft().get())
+        while pending:
+            collect(pending.popleft().get())
+        # Let the workers exit normally so they flush their image_refs
+        pool.close()
+        pool.join()
+
+    for table, writer in writers.items():
+        writer.close()
+        progress.add_written(writer.written)
+        print(f"{table}: {writer.written} rows inserted.")
+    print(progress.summary())
+    if failed.is_set():
+        print("Some image_refs rows could not be inserted; the ledger is left unchanged, so the "
+              "articles of this run are extracted again next time.")
+        return
+    with BatchWriter(store, LEDGER, LEDGER_COLUMNS, batch_size=BATCH_SIZE) as ledger:
+        ledger.add_many(ingested)
 
 
 if __name__ == "__main__":
-    # get_publication_subject(r'C:\Users\Administrator\Downloads\pone.0282775.nxml')
     root_directory = r"data\input-data\ftu-pub-pmc"
     create_tables()
     file_paths = process_nxml_files_in_directory(root_directory)
-
-    process_img_fulltext(file_paths)
-    process_ftu(file_paths)
-    process_publication_summary(file_paths)
-    process_image_refs(file_paths)
-    process_publication_authors(file_paths)
-    process_publication_subject(file_paths)
-    process_publication_summary(file_paths)
+    todo, hashes, stale = plan_ingestion(file_paths)
+    print(f"{len(todo)} of {len(file_paths)} article files are new or changed.")
+    if stale:
+        delete_stale(stale, todo)
+    process_articles(todo, hashes)
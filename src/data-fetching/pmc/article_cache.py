@@ -0,0 +1,63 @@
+"""
+Cache of parsed PMC articles.
+Each article record from nxml_extract.article_record (metadata, subjects, authors, figures
+with captions, paragraphs with their text, XML and xref spans) is stored as gzip-compressed
+msgpack, one file per article file, sharded into folders by the last two digits of the pmcid:
+    <cache_dir>/67/PMC1234567-<nxml name>.msgpack.gz
+A record is used while its file hash and record layout match, so a new extractor or a change
+of the table rows (EXTRACTOR_VERSION) is served from the cache without parsing any XML.
+
+    cache = ArticleCache('data/input-data/ftu-pub-pmc-cache')
+    for record in cache.records():
+        ...
+"""
+import gzip
+import os
+
+import msgpack
+
+from nxml_extract import RECORD_VERSION, article_pmcid
+
+
+class ArticleCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def path(self, file_path):
+        pmcid = article_pmcid(file_path)
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        return os.path.join(self.cache_dir, pmcid[-2:], f'{pmcid}-{name}.msgpack.gz')
+
+    def get(self, file_path, file_hash):
+        """The cached record of `file_path`, or None when it is missing or stale."""
+        try:
+            record = self._read(self.path(file_path))
+        except (OSError, EOFError, ValueError, msgpack.UnpackException):
+            return None
+        if record.get('file_hash') != file_hash or record.get('record_version') != RECORD_VERSION:
+            return None
+        return record
+
+    def put(self, record, file_hash):
+        path = self.path(record['file_path'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name first, so readers never see a partial record
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+            f.write(msgpack.packb({**record, 'file_hash': file_hash}, use_bin_type=True))
+        os.replace(tmp_path, path)
+
+    def records(self):
+        """Every cached record, shard by shard."""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for shard in sorted(os.listdir(self.cache_dir)):
+            shard_dir = os.path.join(self.cache_dir, shard)
+            for name in sorted(os.listdir(shard_dir)):
+                if name.endswith('.msgpack.gz'):
+                    yield self._read(os.path.join(shard_dir, name))
+
+    @staticmethod
+    def _read(path):
+        with gzip.open(path, 'rb') as f:
+            return msgpack.unpackb(f.read(), raw=False)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark: inserting pandas batches of the extractor tables row by row (a tuple per
+DataFrame.iterrows() row, in batches of 1000, as the previous insert_* helpers did) versus
+storage.insert_frame, which sends whole column arrays in large blocks.
+Synthetic rows with the columns of each table in nxml_extract.COLUMNS are used.
+    python src/data-fetching/pmc/bench-columnar-insert.py --backend sqlite
+    python src/data-fetching/pmc/bench-columnar-insert.py --clickhouse-host localhost
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [HERE, os.path.join(HERE, '..', '..', 'lm-rag')]
+from nxml_extract import COLUMNS
+from storage import add_storage_args, insert_frame, open_storage_from_args
+
+# Typical lengths of the longer text columns
+TEXT_LENGTH = {'caption': 600, 'abstract': 1500, 'ref_xml': 900, 'ref_text': 600}
+
+
+def make_frame(columns, n):
+    return pd.DataFrame({col: [f"{col}-{i}".ljust(TEXT_LENGTH.get(col, 12), 'x') for i in range(n)]
+                         for col in columns})
+
+
+def insert_iterrows(store, table, df, columns, batch_size=1000):
+    for start in range(0, len(df), batch_size):
+        batch_data = df.iloc[start:start + batch_size]
+        records = [tuple(row[col] for col in columns) for _, row in batch_data.iterrows()]
+        store.insert(table, columns, records)
+
+
+def timed(store, table, columns, fn):
+    store.execute(f"DROP TABLE IF EXISTS {table}")
+    store.create_table(table, {col: 'String' for col in columns}, order_by=['pmcid'])
+    start = time.time()
+    fn()
+    elapsed = time.time() - start
+    rows = store.count(table, final=False)
+    store.execute(f"DROP TABLE IF EXISTS {table}")
+    return rows, elapsed
+
+
+def main(args):
+    store = open_storage_from_args(args)
+    totals = {'iterrows': [0, 0.0], 'insert_frame': [0, 0.0]}
+    for name, columns in COLUMNS.items():
+        table = f"bench_{name}"
+        df = make_frame(columns, args.rows)
+        for path, fn in (('iterrows', lambda: insert_iterrows(store, table, df, columns)),
+                         ('insert_frame', lambda: insert_frame(store, table, df, columns, args.block_size))):
+            rows, elapsed = timed(store, table, columns, fn)
+            if rows != len(df):
+                print(f"Warning: expected {len(df)} rows in {table}, found {rows}")
+            totals[path][0] += rows
+            totals[path][1] += elapsed
+            print(f"{name:<20} {path:<13}: {rows:>8} rows in {elapsed:7.2f}s -> {rows / elapsed:10.1f} rows/s")
+    for path, (rows, elapsed) in totals.items():
+        print(f"{'all tables':<20} {path:<13}: {rows:>8} rows in {elapsed:7.2f}s -> {rows / elapsed:10.1f} rows/s")
+    store.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare iterrows and columnar inserts of the extractor tables')
+    parser.add_argument('--rows', type=int, default=50000, help='Rows per table')
+    parser.add_argument('--block-size', type=int, default=100000)
+    add_storage_args(parser, sqlite_path='bench.sqlite')
+    main(parser.parse_args())
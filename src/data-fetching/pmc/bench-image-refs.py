@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark: image_refs inserts with a new connection per article (the previous
+insert_image_refs) versus one connection per pool worker, opened by the pool initializer,
+with references buffered across articles (5-extract-metadata.py).
+Articles are parsed once up front, so only the insert path is timed.
+    python src/data-fetching/pmc/bench-image-refs.py --nxml-dir data/input-data/ftu-pub-pmc --backend sqlite
+    python src/data-fetching/pmc/bench-image-refs.py --nxml-dir data/input-data/ftu-pub-pmc --clickhouse-host localhost
+"""
+import argparse
+import os
+import sys
+import time
+from multiprocessing import Pool
+from multiprocessing.util import Finalize
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [HERE, os.path.join(HERE, '..', '..', 'lm-rag')]
+from batch_writer import BatchWriter
+from nxml_extract import COLUMNS, extract_article
+from storage import add_storage_args, open_storage, storage_config
+
+TABLE = 'bench_image_refs'
+SCHEMA = {c: 'String' for c in COLUMNS['image_refs']}
+
+store_config = None
+worker_refs = None
+
+
+def insert_per_article(refs):
+    """The previous path: connect, insert one article's references, disconnect."""
+    worker_store = open_storage(**store_config)
+    worker_store.insert(TABLE, COLUMNS['image_refs'], refs)
+    worker_store.close()
+
+
+def init_worker(config, batch_size):
+    global store_config, worker_refs
+    store_config = config
+    if batch_size:
+        worker_store = open_storage(**config)
+        worker_refs = BatchWriter(worker_store, TABLE, COLUMNS['image_refs'], batch_size=batch_size)
+        Finalize(None, worker_refs.close, exitpriority=10)
+
+
+def insert_buffered(refs):
+    worker_refs.add_many(refs)
+
+
+def run(config, articles, workers, batch_size):
+    store = open_storage(**config)
+    store.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    store.create_table(TABLE, SCHEMA, order_by=['pmcid'])
+    insert = insert_buffered if batch_size else insert_per_article
+    start = time.time()
+    with Pool(workers, initializer=init_worker, initargs=(config, batch_size)) as pool:
+        for _ in pool.imap_unordered(insert, articles, chunksize=8):
+            pass
+        pool.close()
+        pool.join()
+    elapsed = time.time() - start
+    rows = store.count(TABLE, final=False)
+    store.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    store.close()
+    return rows, elapsed
+
+
+def main(args):
+    config = storage_config(args)
+    file_paths = sorted(os.path.join(d, f) for d, _, files in os.walk(args.nxml_dir)
+                        for f in files if f.endswith('.nxml'))[:args.limit]
+    articles = [refs for refs in (extract_article(p)['image_refs'] for p in file_paths) if refs]
+    total = sum(map(len, articles))
+    print(f"{len(file_paths)} articles, {len(articles)} with references, {total} image_refs rows, "
+          f"{args.workers} workers")
+
+    for name, batch_size in (('connection per article', 0), ('connection per worker', args.batch_size)):
+        rows, elapsed = run(config, articles, args.workers, batch_size)
+        if rows != total:
+            print(f"Warning: expected {total} rows, found {rows}")
+        print(f"{name:<24}: {rows:>8} rows in {elapsed:8.2f}s -> {rows / elapsed:10.1f} rows/s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare per-article and per-worker image_refs inserts')
+    parser.add_argument('--nxml-dir', required=True, help='Folder searched recursively for .nxml files')
+    parser.add_argument('--limit', type=int, help='Use only the first N articles')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--batch-size', type=int, default=5000)
+    add_storage_args(parser, sqlite_path='bench.sqlite')
+    main(parser.parse_args())
@@ -0,0 +1,199 @@
+"""
+Single-pass metadata extraction from PMC .nxml articles.
+extract_article parses an article once with lxml and returns the rows of every table filled by
+5-extract-metadata.py (figures, publication summary, subjects, authors, paragraph references
+and full-text paragraphs), instead of one BeautifulSoup parse per table. The parse is reduced
+to one normalized article record (article_record) and the rows are derived from that record.
+Fields are taken the same way as the BeautifulSoup extractors did: the first matching element
+in document order, `.text` as the concatenated text and get_text(strip=True) as the stripped,
+non-empty pieces.
+"""
+import os
+import re
+
+from lxml import etree
+
+# Recorded in the ingestion ledger; bump it when the extracted rows change, so every article
+# is extracted again on the next run
+EXTRACTOR_VERSION = '1'
+# Layout of article_record; cached records of another layout are rebuilt from the XML
+RECORD_VERSION = 1
+
+XLINK_HREF = '{http://www.w3.org/1999/xlink}href'
+PUB_TYPES = ['ppub', 'epub', 'pmc-release']
+
+# Column order of the rows returned for each table
+COLUMNS = {
+    'ftu_pub_pmc': ['pmcid', 'figid', 'label', 'graphic', 'caption', 'file_path'],
+    'publication_summary': ['pmcid', 'article_title', 'pmid', 'doi', 'abstract', 'pub_year',
+                            'journal_title', 'file_path'],
+    'publication_subject': ['pmcid', 'group_type', 'subject', 'file_path'],
+    'publication_authors': ['pmcid', 'surname', 'given_names', 'email', 'file_path'],
+    'image_refs': ['pmcid', 'rid', 'ref_type', 'ref_xml', 'ref_text', 'file_path'],
+    'img_fulltext': ['pmcid', 'pid', 'ref_xml', 'ref_text'],
+}
+
+# recover: keep what can be read from a damaged file, as the BeautifulSoup parser did
+_PARSER = etree.XMLParser(recover=True, huge_tree=True, no_network=True)
+# Namespace declarations lxml adds to the outer tag of a serialized fragment
+_NS_DECL = re.compile(r'\s+xmlns(?::[\w.-]+)?="[^"]*"')
+
+
+def _text(el):
+    return ''.join(el.itertext()) if el is not None else ''
+
+
+def _stripped(el, separator=''):
+    if el is None:
+        return ''
+    return separator.join(s for s in (t.strip() for t in el.itertext()) if s)
+
+
+def _xml(el):
+    xml = etree.tostring(el, encoding='unicode', with_tail=False)
+    end = xml.find('>') + 1
+    return _NS_DECL.sub('', xml[:end]) + xml[end:]
+
+
+def _subjects(group, group_type):
+    rows = [(group_type, _stripped(subject)) for subject in group.iterchildren('subject')]
+    for child in group.iterchildren('subj-group'):
+        rows.extend(_subjects(child, group_type))
+    return rows
+
+
+def article_pmcid(file_path):
+    """Articles are unpacked to <pmcid>/<name>.nxml."""
+    return os.path.basename(os.path.dirname(file_path))
+
+
+def parse_article(file_path):
+    with open(file_path, 'rb') as f:
+        return etree.parse(f, _PARSER).getroot()
+
+
+def _paragraph(p, in_body):
+    """
+    A paragraph with its concatenated and stripped text, its XML, and the
+    [rid, ref-type, start, end] text span of each xref in it (in document order).
+    """
+    pieces, xrefs = [], []
+    size = 0
+
+    def add(text):
+        nonlocal size
+        if text:
+            pieces.append(text)
+            size += len(text)
+
+    def walk(el):
+        # Comments and processing instructions have no text of their own, only a tail
+        if not isinstance(el.tag, str):
+            return
+        span = None
+        if el.tag == 'xref':
+            span = [el.get('rid', ''), el.get('ref-type', ''), size, size]
+            xrefs.append(span)
+        add(el.text)
+        for child in el:
+            walk(child)
+            add(child.tail)
+        if span:
+            span[3] = size
+
+    walk(p)
+    return {
+        'id': p.get('id') or '',
+        'in_body': in_body,
+        'xml': _xml(p),
+        'text': ''.join(pieces),
+        'text_stripped': ''.join(s for s in (t.strip() for t in pieces) if s),
+        'xrefs': xrefs,
+    }
+
+
+def article_record(file_path, root=None):
+    """
+    The normalized content of one article, from a single parse: metadata, subjects, authors,
+    figures and every paragraph. All table rows are derived from it (table_rows), and it is what
+    article_cache stores.
+    """
+    if root is None:
+        root = parse_article(file_path)
+
+    title_group = root.find('.//title-group')
+    abstract = root.find('.//abstract')
+    pub_year = ''
+    for pub_type in PUB_TYPES:
+        pub_date = root.find(f'.//pub-date[@pub-type="{pub_type}"]')
+        if pub_date is not None and pub_date.find('.//year') is not None:
+            pub_year = _text(pub_date.find('.//year'))
+            break
+
+    subjects = []
+    for group in root.iterfind('.//subj-group[@subj-group-type]'):
+        subjects.extend(_subjects(group, group.get('subj-group-type')))
+
+    authors = []
+    for contrib in root.iter('contrib'):
+        name = contrib.find('.//name')
+        surname = _text(name.find('.//surname')) if name is not None else ''
+        given_names = _text(name.find('.//given-names')) if name is not None else ''
+        authors.append([surname, given_names, _text(contrib.find('.//email'))])
+
+    figures = []
+    for fig in root.iter('fig'):
+        graphic = fig.find('.//graphic')
+        figures.append([fig.get('id', ''), _stripped(fig.find('.//label')),
+                        graphic.get(XLINK_HREF, '') if graphic is not None else '',
+                        _stripped(fig.find('.//caption'), ' ')])
+
+    body = root.find('.//body')
+    paragraphs = [_paragraph(p, body is not None and any(a is body for a in p.iterancestors('body')))
+                  for p in root.iter('p')]
+
+    return {
+        'record_version': RECORD_VERSION,
+        'pmcid': article_pmcid(file_path),
+        'file_path': file_path,
+        'meta': {
+            'article_title': _text(title_group.find('.//article-title')) if title_group is not None else '',
+            'pmid': _text(root.find('.//article-id[@pub-id-type="pmid"]')),
+            'doi': _text(root.find('.//article-id[@pub-id-type="doi"]')),
+            'abstract': _xml(abstract) if abstract is not None else '',
+            'pub_year': pub_year,
+            'journal_title': _text(root.find('.//journal-title')),
+        },
+        'subjects': [list(subject) for subject in dict.fromkeys(subjects)],
+        'authors': authors,
+        'figures': figures,
+        'has_body': body is not None,
+        'paragraphs': paragraphs,
+    }
+
+
+def table_rows(record):
+    """{table: [row tuple in COLUMNS order]} for one article record."""
+    pmcid, file_path, meta = record['pmcid'], record['file_path'], record['meta']
+    rows = {}
+    # Articles without figures keep one placeholder row (with an empty pmcid, as before)
+    rows['ftu_pub_pmc'] = ([(pmcid, *figure, file_path) for figure in record['figures']]
+                           or [('', '', '', '', '', file_path)])
+    rows['publication_summary'] = [(pmcid, meta['article_title'], meta['pmid'], meta['doi'], meta['abstract'],
+                                    meta['pub_year'], meta['journal_title'], file_path)]
+    rows['publication_subject'] = [(pmcid, group_type, subject, file_path)
+                                   for group_type, subject in record['subjects']]
+    rows['publication_authors'] = [(pmcid, *author, file_path) for author in record['authors']]
+    rows['image_refs'] = [(pmcid, rid, ref_type, p['xml'], p['text'], file_path)
+                          for p in record['paragraphs'] for rid, ref_type, _, _ in p['xrefs']]
+    if record['has_body']:
+        rows['img_fulltext'] = [(pmcid, p['id'], p['xml'], p['text_stripped'])
+                                for p in record['paragraphs'] if p['in_body'] and p['id'].startswith('Par')]
+    else:
+        rows['img_fulltext'] = [(pmcid, '', '', '')]
+    return rows
+
+
+def extract_article(file_path, root=None):
+    """{table: [row tuple in COLUMNS order]} for one article."""
+    return table_rows(article_record(file_path, root))
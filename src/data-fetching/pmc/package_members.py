@@ -0,0 +1,65 @@
+"""
+Members of PMC OA packages that the pipeline uses, and a streaming extractor for them.
+Only the article XML (.nxml) and the figure images are read downstream; PDFs, supplementary
+data and media are never written. When a figure comes in several formats, only the first
+of PREFERRED_IMAGE_FORMATS is kept, the choice 4-extract-img-path.py makes.
+"""
+import os
+import shutil
+import tarfile
+
+# Image formats in order of preference
+PREFERRED_IMAGE_FORMATS = ['jpg', 'png', 'jpeg', 'bmp', 'gif']
+KEEP_EXTENSIONS = {'nxml', *PREFERRED_IMAGE_FORMATS}
+
+
+def member_extension(name):
+    return os.path.splitext(name)[1].lower().lstrip('.')
+
+
+def extract_members(fileobj, target_dir, mode='r|gz'):
+    """
+    Extract the wanted members of a .tar.gz read sequentially from `fileobj` (a download
+    stream or an open file) into `target_dir`, keeping their paths.
+    Returns {'members', 'kept', 'bytes', 'errors'}; corrupt or truncated input raises
+    tarfile.ReadError, EOFError or zlib.error.
+    """
+    stats = {'members': 0, 'kept': 0, 'bytes': 0, 'errors': []}
+    images = {}  # member path without extension -> (preference, path) of the image written so far
+    with tarfile.open(fileobj=fileobj, mode=mode) as tar:
+        for member in tar:
+            stats['members'] += 1
+            ext = member_extension(member.name)
+            if not member.isfile() or ext not in KEEP_EXTENSIONS:
+                continue
+            if os.path.isabs(member.name) or '..' in member.name.split('/'):
+                stats['errors'].append(f"Unsafe member path {member.name}")
+                continue
+            name = os.path.normpath(member.name)
+            path = os.path.join(target_dir, name)
+
+            is_image = ext in PREFERRED_IMAGE_FORMATS
+            if is_image:
+                key = os.path.splitext(name)[0]
+                rank = PREFERRED_IMAGE_FORMATS.index(ext)
+                if key in images and images[key][0] <= rank:
+                    continue
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                with tar.extractfile(member) as src, open(path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1 << 20)
+            except OSError as e:
+                stats['errors'].append(f"Failed to extract {member.name}: {e}")
+                # Keep no partial file; an image written earlier for the same figure stays
+                if os.path.exists(path):
+                    os.remove(path)
+                continue
+            stats['kept'] += 1
+            stats['bytes'] += member.size
+            if is_image:
+                if key in images:
+                    os.remove(images[key][1])
+                    stats['kept'] -= 1
+                images[key] = (rank, path)
+    return stats
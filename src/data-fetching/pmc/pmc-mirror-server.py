@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the PMC package server, for testing 2-download-pmc-package.py.
+Serves a folder laid out like https://ftp.ncbi.nlm.nih.gov/pub/pmc/ (e.g. oa_package/xx/yy/
+PMC123.tar.gz) with HTTP Range support. --drop-every N cuts every Nth response off halfway,
+so retries and resumed downloads can be exercised.
+    python src/data-fetching/pmc/pmc-mirror-server.py --root mirror --port 8000 --drop-every 3
+"""
+import argparse
+import itertools
+import os
+import re
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+_RANGE = re.compile(r'bytes=(\d+)-(\d*)$')
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    drop_every = 0
+    served = itertools.count(1)
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            return super().do_GET()
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        m = _RANGE.match(self.headers.get('Range', ''))
+        if m:
+            start = int(m.group(1))
+            end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+        length = end - start + 1
+        self.send_response(206 if m else 200)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Length', str(length))
+        self.send_header('Accept-Ranges', 'bytes')
+        if m:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+
+        drop = self.drop_every and next(self.served) % self.drop_every == 0
+        with open(path, 'rb') as f:
+            f.seek(start)
+            self.wfile.write(f.read(length // 2 if drop else length))
+        if drop:
+            self.close_connection = True
+
+
+def main(args):
+    RangeRequestHandler.drop_every = args.drop_every
+    handler = partial(RangeRequestHandler, directory=args.root)
+    with ThreadingHTTPServer(('127.0.0.1', args.port), handler) as server:
+        print(f"Serving {args.root} on http://127.0.0.1:{args.port}/")
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a local PMC mirror with Range support')
+    parser.add_argument('--root', required=True, help='Folder standing in for /pub/pmc/')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--drop-every', type=int, default=0, help='Cut off every Nth response halfway')
+    main(parser.parse_args())
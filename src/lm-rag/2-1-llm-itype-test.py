@@ -2,7 +2,6 @@
 # 6-3-fastgpt-imgtype-test.py
 
 import os
-import re
 import json
 import uuid
 import time
@@ -12,6 +11,8 @@ import argparse
 import pandas as pd
 from tqdm import tqdm
 
+from json_scan import extract_json_objects
+
 # ===== Configuration via CLI args =====
 def parse_args():
     parser = argparse.ArgumentParser()
@@ -49,18 +50,6 @@ def fastgpt_call(api_url, token, model, question, prompt):
         return ''
     return ''
 
-# ===== JSON extraction =====
-def extract_json_objects(text: str) -> list:
-    pattern = r'\{(?:[^{}]|\{(?:[^{}]|\{[^{}]*\})*\})*\}'
-    matches = re.findall(pattern, text)
-    objs = []
-    for m in matches:
-        try:
-            objs.append(json.loads(m))
-        except json.JSONDecodeError:
-            continue
-    return objs
-
 # ===== Load inputs =====
 def load_prompt(path):
     with open(path, 'r', encoding='utf-8') as f:
@@ -3,26 +3,27 @@ Batch pipeline: read ftu_pub_pmc records, run vision models, store responses in
 then run LLM classification (llama3.2:latest) and store classification flags.
 """
 import os
-import re
 import json
 import time
 import uuid
 import argparse
 import requests
-from clickhouse_driver import Client
 from tqdm import tqdm
 
-# ===== Helpers =====
-def extract_json_objects(text: str) -> list:
-    pattern = r'\{(?:[^{}]|\{(?:[^{}]|\{[^{}]*\})*\})*\}'
-    objs = []
-    for m in re.findall(pattern, text):
-        try:
-            objs.append(json.loads(m))
-        except json.JSONDecodeError:
-            continue
-    return objs
+from batch_writer import BatchWriter
+from ch_stream import prefetch
+from json_scan import extract_json_objects
+from storage import add_storage_args, open_storage_from_args
+
+VISION_COLS = ['img_name', 'llama', 'llava', 'phi3', 'phi35', 'pixtral',
+               'file_path', 'pmcid', 'ext', 'graphic']
+# Microsecond versions, so argMax in the _latest view never sees two versions of a row tie
+VISION_SCHEMA = {**{c: 'String' for c in VISION_COLS}, 'created_at': 'DateTime64(6) DEFAULT now64(6)'}
+LLM_COLS = ['pmcid', 'graphic', 'ext', 'llama32', 'run_time',
+            'micro', 'statis', 'schema', '3d', 'chem', 'math']
+LLM_SCHEMA = {**{c: 'String' for c in LLM_COLS}, 'update_time': 'DateTime DEFAULT now()'}
 
+# ===== Helpers =====
 # FastGPT/LLM call for classification
 def fastgpt_call(api_url, token, model, question, prompt):
     headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
@@ -48,11 +49,7 @@ def fastgpt_call(api_url, token, model, question, prompt):
 def parse_args():
     p = argparse.ArgumentParser(description='Batch run vision+LLM pipelines')
     p.add_argument('--pipeline', type=str, default='3-0-lvm_pipeline.py', help='Path to vision pipeline module')
-    p.add_argument('--clickhouse-host', required=True)
-    p.add_argument('--clickhouse-port', type=int, default=9000)
-    p.add_argument('--clickhouse-user', required=True)
-    p.add_argument('--clickhouse-password', required=True)
-    p.add_argument('--clickhouse-database', required=True)
+    add_storage_args(p)
     p.add_argument('--vision-table', default='hra_rag_ftu.vision_results')
     p.add_argument('--llm-table', default='hra_rag_ftu.vision_llm')
     p.add_argument('--entity-prompt', required=True, help='Prompt text for vision models')
@@ -61,6 +58,8 @@ def parse_args():
     p.add_argument('--ftu-table', default='ftu_pub_pmc')
     p.add_argument('--fastgpt-api-url', required=True)
     p.add_argument('--fastgpt-token', required=True)
+    p.add_argument('--batch-size', type=int, default=200, help='Rows per versioned insert batch')
+    p.add_argument('--prefetch', type=int, default=1000, help='Rows buffered ahead of the models')
     return p.parse_args()
 
 # ===== Main =====
@@ -71,178 +70,134 @@ def main(args):
     lvm = importlib.util.module_from_spec(spec)
     spec.loader.exec_module(lvm)
 
-    # Connect ClickHouse
-    client = Client(
-        host=args.clickhouse_host,
-        port=args.clickhouse_port,
-        user=args.clickhouse_user,
-        password=args.clickhouse_password,
-        database=args.clickhouse_database
-    )
+    # Connect storage
+    store = open_storage_from_args(args)
 
     # 1. Create vision_results table
-    vision_ddl = f"""
-CREATE TABLE IF NOT EXISTS {args.vision_table} (
-    img_name String,
-    llama String,
-    llava String,
-    phi3 String,
-    phi35 String,
-    pixtral String,
-    file_path String,
-    pmcid String,
-    ext String,
-    graphic String,
-    created_at DateTime DEFAULT now()
-) ENGINE = ReplacingMergeTree(created_at)
-PARTITION BY toYYYYMM(created_at)
-ORDER BY file_path
-"""
-    client.execute(vision_ddl)
-
-    # 2. Insert base records from ftu_pub_pmc (only jpg/jpeg)
-    insert_sql = f"""
-INSERT INTO {args.vision_table} (img_name,llama,llava,phi3,phi35,pixtral,file_path,pmcid,ext,graphic)
-SELECT
-    concat(
-      arrayElement(splitByChar('/', file_path), -2), '/', arrayElement(splitByChar('/', file_path), -1)
-    ) AS img_name,
-    '' AS llama,
-    '' AS llava,
-    '' AS phi3,
-    '' AS phi35,
-    '' AS pixtral,
-    file_path,
-    pmcid,
-    substringAfterLast(file_path, '.') AS ext,
-    graphic
-FROM {args.ftu_table}
-WHERE lower(substringAfterLast(file_path, '.')) IN ('jpg','jpeg')
-"""
-    client.execute(insert_sql)
-
-    # 3. Query records for vision models
-    vision_rows = client.execute(
-        f"SELECT img_name,file_path,pmcid,graphic,ext FROM {args.vision_table}"
-    )
-
-    # 4. Run vision pipelines and update responses (only jpg/jpeg)
-    for img_name, file_path, pmcid, graphic, ext in tqdm(vision_rows, desc='Vision models'):
-        # Prepare record
-        rec = {'entity_prompt': args.entity_prompt, 'img_path': file_path}
-        # Llama-3.2
-        llama_model, llama_proc = lvm.load_llama_vision_model_and_processor(rec['entity_prompt'])
-        lvm.process_llama32_image(rec, llama_model, llama_proc, rec['entity_prompt'], worker_id=0)
-        resp_llama = rec.get('llama32_entity', '')
-        # LlaVA
-        lvm.ollama_vision_task(rec, worker_id=0, ip_port_list=lvm.config.OLLAMA_IP_PORTS)
-        resp_llava = rec.get('llava_entity', '')
-        # Phi-3
-        phi3_model, phi3_proc = lvm.load_phi3_model_and_processor(rec['entity_prompt'])
-        lvm.process_phi3_image(rec, phi3_model, phi3_proc, rec['entity_prompt'], worker_id=0)
-        resp_phi3 = rec.get('phi3_entity', '')
-        # Phi-3.5
-        phi35_model, phi35_proc = lvm.load_phi35_model_and_processor(rec['entity_prompt'])
-        lvm.process_phi35_image(rec, phi35_model, phi35_proc, rec['entity_prompt'], worker_id=0)
-        resp_phi35 = rec.get('phi35_entity', '')
-        # Pixtral
-        lvm.send_pixtral_request(rec, worker_id=0)
-        resp_pixtral = json.dumps(rec.get('pixtral_entity', []), ensure_ascii=False)
-        # Escape single quotes
-        def esc(s): return s.replace("'", "''")
-        upd = f"""
-ALTER TABLE {args.vision_table}
-UPDATE
-    llama='{esc(resp_llama)}',
-    llava='{esc(resp_llava)}',
-    phi3='{esc(resp_phi3)}',
-    phi35='{esc(resp_phi35)}',
-    pixtral='{esc(resp_pixtral)}'
-WHERE
-    file_path='{file_path}' AND pmcid='{pmcid}' AND graphic='{graphic}'
-"""
-        client.execute(upd)
+    store.create_table(args.vision_table, VISION_SCHEMA, order_by=['file_path'],
+                       version='created_at', partition_by='toYYYYMM(created_at)')
 
-    # 5. Create vision_llm table
-    llm_ddl = f"""
-CREATE TABLE IF NOT EXISTS {args.llm_table} (
-    pmcid String,
-    graphic String,
-    ext String,
-    llama32 String,
-    run_time String,
-    update_time DateTime DEFAULT now(),
-    micro String,
-    statis String,
-    schema String,
-    `3d` String,
-    chem String,
-    math String
-) ENGINE = ReplacingMergeTree(update_time)
-PRIMARY KEY (pmcid,graphic,ext)
-ORDER BY (pmcid,graphic,ext)
-"""
-    client.execute(llm_ddl)
+    # Latest version of each vision_results row. The table is partitioned by created_at, so
+    # FINAL cannot collapse versions written in different months; argMax can.
+    vision_latest = f"{args.vision_table}_latest"
+    store.create_latest_view(vision_latest, args.vision_table, ['file_path'], VISION_COLS, 'created_at')
+
+    # 2. Insert base records from ftu_pub_pmc (only jpg/jpeg) that are not in the table yet
+    base_rows = store.stream(f"""
+SELECT file_path, pmcid, graphic
+FROM {store.name(args.ftu_table)}
+WHERE (lower(file_path) LIKE '%.jpg' OR lower(file_path) LIKE '%.jpeg')
+  AND file_path NOT IN (SELECT file_path FROM {store.name(args.vision_table)})
+""")
+    with BatchWriter(store, args.vision_table, VISION_COLS, batch_size=5000) as base_writer:
+        for file_path, pmcid, graphic in base_rows:
+            img_name = '/'.join(file_path.split('/')[-2:])
+            ext = file_path.rsplit('.', 1)[-1]
+            base_writer.add((img_name, '', '', '', '', '', file_path, pmcid, ext, graphic))
+
+    # 3. Stream records still waiting for vision model responses
+    vision_pending = "llama='' AND llava='' AND phi3='' AND phi35='' AND pixtral=''"
+    vision_total = store.count(vision_latest, vision_pending, final=False)
+    vision_rows = prefetch(store.select(
+        vision_latest, ['img_name', 'file_path', 'pmcid', 'graphic', 'ext'], vision_pending,
+        final=False, as_dict=False
+    ), maxsize=args.prefetch)
 
-    # 6. Load metadata from ftu_pub_pmc and image_refs
-    ftu_rows = client.execute(f"SELECT pmcid,graphic,caption,label FROM {args.ftu_table}")
-    meta = {(pmcid,graphic): {'caption': cap, 'label': lab} for pmcid,graphic,cap,lab in ftu_rows}
-    ref_rows = client.execute(f"SELECT pmcid,rid,ref_text FROM {args.image_refs_table} WHERE ref_type='fig'")
-    refs = {}
-    for pmcid,rid,txt in ref_rows:
-        refs.setdefault((pmcid,str(rid)), []).append(txt)
+    # 4. Run vision pipelines and write the responses as new row versions (only jpg/jpeg)
+    with BatchWriter(store, args.vision_table, VISION_COLS, batch_size=args.batch_size) as vision_writer:
+        for img_name, file_path, pmcid, graphic, ext in tqdm(vision_rows, total=vision_total, desc='Vision models'):
+            # Prepare record
+            rec = {'entity_prompt': args.entity_prompt, 'img_path': file_path}
+            # Llama-3.2
+            llama_model, llama_proc = lvm.load_llama_vision_model_and_processor(rec['entity_prompt'])
+            lvm.process_llama32_image(rec, llama_model, llama_proc, rec['entity_prompt'], worker_id=0)
+            resp_llama = rec.get('llama32_entity', '')
+            # LlaVA
+            lvm.ollama_vision_task(rec, worker_id=0, ip_port_list=lvm.config.OLLAMA_IP_PORTS)
+            resp_llava = rec.get('llava_entity', '')
+            # Phi-3
+            phi3_model, phi3_proc = lvm.load_phi3_model_and_processor(rec['entity_prompt'])
+            lvm.process_phi3_image(rec, phi3_model, phi3_proc, rec['entity_prompt'], worker_id=0)
+            resp_phi3 = rec.get('phi3_entity', '')
+            # Phi-3.5
+            phi35_model, phi35_proc = lvm.load_phi35_model_and_processor(rec['entity_prompt'])
+            lvm.process_phi35_image(rec, phi35_model, phi35_proc, rec['entity_prompt'], worker_id=0)
+            resp_phi35 = rec.get('phi35_entity', '')
+            # Pixtral
+            lvm.send_pixtral_request(rec, worker_id=0)
+            resp_pixtral = json.dumps(rec.get('pixtral_entity', []), ensure_ascii=False)
+            vision_writer.add((
+                img_name, resp_llama, resp_llava, resp_phi3, resp_phi35, resp_pixtral,
+                file_path, pmcid, ext, graphic
+            ))
 
-    # 7. Load classification prompt
+    # 5. Create vision_llm table
+    store.create_table(args.llm_table, LLM_SCHEMA, order_by=['pmcid', 'graphic', 'ext'],
+                       version='update_time')
+
+    # 6. Load classification prompt
     with open(args.classify_prompt, 'r', encoding='utf-8') as f:
         class_prompt = f.read().strip()
 
-    # 8. Fetch vision_results for classification
-    vr_rows = client.execute(
-        f"SELECT pmcid,graphic,ext,llama,llava,phi3,phi35,pixtral FROM {args.vision_table}"
-    )
-    for pmcid,graphic,ext,rlama,rllava,rphi3,rphi35,rpix in tqdm(vr_rows, desc='Classification'):
-        if ext.lower() not in ('jpg','jpeg'):
-            continue
-        # Metadata
-        key = (pmcid,graphic)
-        md = meta.get(key, {})
-        caption = md.get('caption','')
-        label = md.get('label','')
-        # Descriptions from vision responses
-        resp_list = [rlama, rllava, rphi3, rphi35, rpix]
-        descs = [f"Description #{i+1} for this figure: {r}" for i,r in enumerate(resp_list)]
-        descriptions = '\n'.join(descs)
-        references = refs.get(key, [])
-        question = (
-            f"Classify the type of figure for the caption and references provided for {label}.\n"
-            f"Caption: {caption}\n"
-            f"References: {references}\n"
-            f"Label: {label}\n"
-            f"{descriptions}\n"
-            f"Prompt: {class_prompt}\n"
-        )
-        # Call LLM
-        start = time.time()
-        out = fastgpt_call(args.fastgpt_api_url, args.fastgpt_token, 'llama3.2:latest', question, class_prompt)
-        runtime = f"{time.time()-start:.2f}s"
-        # Parse classification
-        obj = extract_json_objects(out)
-        cl = obj[0] if obj else {}
-        def decide(k):
-            v = cl.get(k, False)
-            if isinstance(v, bool): return 'Yes' if v else 'No'
-            return 'Yes' if str(v).lower() in ('yes','true') else 'No'
-        vals = (
-            pmcid, graphic, ext, out.replace("'","''"), runtime,
-            decide('micro'), decide('statis'), decide('schema'),
-            decide('3d'), decide('chem'), decide('math')
-        )
-        insert_llm = (
-            f"INSERT INTO {args.llm_table} "
-            f"(pmcid,graphic,ext,llama32,run_time,micro,statis,schema,`3d`,chem,math) VALUES "
-            + str([vals])
-        )
-        client.execute(insert_llm)
+    # 7. Stream the latest vision_results joined with captions and figure references
+    vr_where = "lower(ext) IN ('jpg','jpeg')"
+    vr_total = store.count(vision_latest, vr_where, final=False)
+    # any/groupArray on ClickHouse; max/json_group_array (decoded below) on SQLite
+    any_fn, group_fn = ('any', 'groupArray') if store.dialect == 'clickhouse' else ('max', 'json_group_array')
+    vr_rows = prefetch(store.stream(f"""
+SELECT v.pmcid, v.graphic, v.ext, v.llama, v.llava, v.phi3, v.phi35, v.pixtral,
+       m.caption, m.label, r.refs
+FROM {store.name(vision_latest)} AS v
+LEFT JOIN (
+    SELECT pmcid, graphic, {any_fn}(caption) AS caption, {any_fn}(label) AS label
+    FROM {store.name(args.ftu_table)}
+    GROUP BY pmcid, graphic
+) AS m ON v.pmcid = m.pmcid AND v.graphic = m.graphic
+LEFT JOIN (
+    SELECT pmcid, rid AS graphic, {group_fn}(ref_text) AS refs
+    FROM {store.name(args.image_refs_table)}
+    WHERE ref_type = 'fig'
+    GROUP BY pmcid, rid
+) AS r ON v.pmcid = r.pmcid AND v.graphic = r.graphic
+WHERE lower(v.ext) IN ('jpg','jpeg')
+"""), maxsize=args.prefetch)
+
+    # 8. Classify
+    with BatchWriter(store, args.llm_table, LLM_COLS, batch_size=args.batch_size) as llm_writer:
+        for row in tqdm(vr_rows, total=vr_total, desc='Classification'):
+            pmcid, graphic, ext, rlama, rllava, rphi3, rphi35, rpix, caption, label, references = row
+            if isinstance(references, str):
+                references = json.loads(references)
+            references = references or []
+            # Descriptions from vision responses
+            resp_list = [rlama, rllava, rphi3, rphi35, rpix]
+            descs = [f"Description #{i+1} for this figure: {r}" for i,r in enumerate(resp_list)]
+            descriptions = '\n'.join(descs)
+            question = (
+                f"Classify the type of figure for the caption and references provided for {label}.\n"
+                f"Caption: {caption}\n"
+                f"References: {references}\n"
+                f"Label: {label}\n"
+                f"{descriptions}\n"
+                f"Prompt: {class_prompt}\n"
+            )
+            # Call LLM
+            start = time.time()
+            out = fastgpt_call(args.fastgpt_api_url, args.fastgpt_token, 'llama3.2:latest', question, class_prompt)
+            runtime = f"{time.time()-start:.2f}s"
+            # Parse classification
+            obj = extract_json_objects(out)
+            cl = obj[0] if obj else {}
+            def decide(k):
+                v = cl.get(k, False)
+                if isinstance(v, bool): return 'Yes' if v else 'No'
+                return 'Yes' if str(v).lower() in ('yes','true') else 'No'
+            llm_writer.add((
+                pmcid, graphic, ext, out, runtime,
+                decide('micro'), decide('statis'), decide('schema'),
+                decide('3d'), decide('chem'), decide('math')
+            ))
+    store.close()
 
     print('Batch run complete.')
 
@@ -19,6 +19,7 @@ from transformers import (MllamaForConditionalGeneration, AutoProcessor,
 import config  
 from kafka_producer import produce_record_to_kafka
 from logger import logger
+from json_scan import scan_json
 
 # ---- Llama-3.2 Pipeline ----
 def load_llama_vision_model_and_processor(device: str):
@@ -118,14 +119,10 @@ def file_to_data_url(file_path: str) -> str:
 
 
 def extract_json_text(text: str) -> list:
-    """Extract JSON objects from a text string."""
-    matches = re.findall(r'```json\s*(.*?)\s*```', text, re.DOTALL)
+    """Extract JSON values from the ```json blocks of a text string."""
     results = []
-    for m in matches:
-        try:
-            results.append(json.loads(m))
-        except json.JSONDecodeError:
-            continue
+    for m in re.findall(r'```json\s*(.*?)\s*```', text, re.DOTALL):
+        results.extend(scan_json(m, '{['))
     return results
 
 
@@ -1,29 +1,18 @@
 #!/usr/bin/env python3
 import os
-import re
 import json
 import pandas as pd
 import importlib.util
 import torch
 from tqdm import tqdm
 
+from json_scan import extract_json_objects
+
 # Dynamically load the LVM pipeline (3-0-lvm_pipeline.py)
 spec = importlib.util.spec_from_file_location("lvm_pipeline", "3-0-lvm_pipeline.py")
 lvm = importlib.util.module_from_spec(spec)
 spec.loader.exec_module(lvm)
 
-# Extract JSON objects from model responses
-def extract_json_objects(text: str) -> list:
-    pattern = r'\{(?:[^{}]|\{(?:[^{}]|\{[^{}]*\})*\})*\}'
-    matches = re.findall(pattern, text)
-    objs = []
-    for m in matches:
-        try:
-            objs.append(json.loads(m))
-        except json.JSONDecodeError:
-            continue
-    return objs
-
 # Compute Jaccard similarity between two lists
 def jaccard_similarity_list(list1, list2) -> float:
     try:
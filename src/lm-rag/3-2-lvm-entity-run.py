@@ -1,27 +1,17 @@
 #!/usr/bin/env python3
 
 import os
-import re
 import json
 import argparse
 import importlib.util
 import torch
-from clickhouse_driver import Client
 from tqdm import tqdm
 
-# ----------------------
-# Helpers
-# ----------------------
-def extract_json_objects(text: str) -> list:
-    pattern = r'\{(?:[^{}]|\{(?:[^{}]|\{[^{}]*\})*\})*\}'
-    matches = re.findall(pattern, text)
-    objs = []
-    for m in matches:
-        try:
-            objs.append(json.loads(m))
-        except json.JSONDecodeError:
-            continue
-    return objs
+from batch_writer import BatchWriter
+from json_scan import extract_json_objects
+from storage import add_storage_args, open_storage_from_args
+
+NODE_COLS = ['pmcid', 'graphic', 'file_path', 'nodes']
 
 # ----------------------
 # Main
@@ -39,21 +29,13 @@ def main(args):
     with open(prompt_path, 'r', encoding='utf-8') as f:
         prompts = [line.strip() for line in f if line.strip()]
 
-    # 3. Initialize ClickHouse client
-    client = Client(
-        host=args.clickhouse_host,
-        port=args.clickhouse_port,
-        user=args.clickhouse_user,
-        password=args.clickhouse_password,
-        database=args.clickhouse_database
-    )
+    # 3. Open storage
+    store = open_storage_from_args(args)
+    store.create_table(args.table, {**{c: 'String' for c in NODE_COLS}, 'update_time': 'DateTime DEFAULT now()'},
+                       order_by=['pmcid', 'graphic', 'file_path'], version='update_time')
 
-    # 4. Fetch rows needing processing
-    select_sql = (
-        f"SELECT pmcid, graphic, file_path FROM {args.table} "
-        "WHERE nodes = ''"
-    )
-    rows = client.execute(select_sql)
+    # 4. Fetch rows needing processing (latest version of each row only)
+    rows = list(store.select(args.table, ['pmcid', 'graphic', 'file_path'], "nodes = ''", as_dict=False))
     if not rows:
         print("No rows to process.")
         return
@@ -62,23 +44,23 @@ def main(args):
     device = 'cuda' if torch.cuda.is_available() else 'cpu'
     model, processor = lvm.load_phi35_model_and_processor(device)
 
-    # 6. Process each row with each prompt and update ClickHouse
-    for pmcid, graphic, file_path in tqdm(rows, desc='Rows'):
-        for prompt in prompts:
-            record = {'entity_prompt': prompt, 'img_path': file_path}
-            lvm.process_phi35_image(record, model, processor, device, worker_id=0)
-            resp_text = record.get('phi35_entity', '')
-            objs = extract_json_objects(resp_text)
-            ents = objs[0].get('entities', []) if objs else []
-            nodes_json = json.dumps([{'entities': ents}], ensure_ascii=False)
+    # 6. Process each row with each prompt and write the result as a new row version.
+    # The table is a ReplacingMergeTree, so the newest version supersedes the empty one;
+    # as with the previous per-prompt updates, the last prompt's entities are kept.
+    with BatchWriter(store, args.table, NODE_COLS, batch_size=args.batch_size) as writer:
+        for pmcid, graphic, file_path in tqdm(rows, desc='Rows'):
+            nodes_json = ''
+            for prompt in prompts:
+                record = {'entity_prompt': prompt, 'img_path': file_path}
+                lvm.process_phi35_image(record, model, processor, device, worker_id=0)
+                resp_text = record.get('phi35_entity', '')
+                objs = extract_json_objects(resp_text)
+                ents = objs[0].get('entities', []) if objs else []
+                nodes_json = json.dumps([{'entities': ents}], ensure_ascii=False)
+            writer.add((pmcid, graphic, file_path, nodes_json))
+    store.close()
 
-            update_sql = (
-                f"ALTER TABLE {args.table} UPDATE nodes = '{nodes_json}', update_time = now() "
-                f"WHERE pmcid = '{pmcid}' AND graphic = '{graphic}' AND file_path = '{file_path}'"
-            )
-            client.execute(update_sql)
-
-    print("Done! Entities written to ClickHouse table.")
+    print("Done! Entities written to the node table.")
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
@@ -92,29 +74,14 @@ if __name__ == '__main__':
         '--pipeline', type=str, default='3-0-lvm_pipeline.py',
         help='Path to the LVM pipeline module.'
     )
-    parser.add_argument(
-        '--clickhouse-host', type=str, required=True,
-        help='ClickHouse host.'
-    )
-    parser.add_argument(
-        '--clickhouse-port', type=int, default=9000,
-        help='ClickHouse port.'
-    )
-    parser.add_argument(
-        '--clickhouse-user', type=str, required=True,
-        help='ClickHouse username.'
-    )
-    parser.add_argument(
-        '--clickhouse-password', type=str, required=True,
-        help='ClickHouse password.'
-    )
-    parser.add_argument(
-        '--clickhouse-database', type=str, required=True,
-        help='ClickHouse database name.'
-    )
+    add_storage_args(parser)
     parser.add_argument(
         '--table', type=str, default='image_node_lvm_total',
         help='ClickHouse table name.'
     )
+    parser.add_argument(
+        '--batch-size', type=int, default=200,
+        help='Rows per versioned insert batch.'
+    )
     args = parser.parse_args()
     main(args)
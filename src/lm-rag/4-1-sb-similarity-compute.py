@@ -7,12 +7,13 @@ import re
 import pandas as pd
 from pathlib import Path
 
+from json_scan import extract_json_objects, loads_lenient
+
 # Models to process
 MODEL_KEYS = ['qwen', 'llama32', 'gemma', 'llama31']
 
-# Regex for extracting JSON entities
+# Regex for extracting JSON entities from markdown code blocks
 JSON_PATTERN_MARKDOWN = re.compile(r'```json\s*\n(.*?)\n```', re.DOTALL)
-JSON_PATTERN_INLINE = re.compile(r'\{(?:[^{}]|\{(?:[^{}]|\{[^{}]*\})*\})*\}')
 
 
 def extract_ds_query_entities(text):
@@ -21,7 +22,7 @@ def extract_ds_query_entities(text):
     m = JSON_PATTERN_MARKDOWN.search(text)
     if m:
         try:
-            parsed = json.loads(m.group(1).strip())
+            parsed = loads_lenient(m.group(1).strip())
             if isinstance(parsed, list):
                 return parsed
             if isinstance(parsed, dict):
@@ -31,18 +32,11 @@ def extract_ds_query_entities(text):
                     if isinstance(v, list):
                         out.extend(v)
                 return out
-        except json.JSONDecodeError:
+        except ValueError:
             pass
 
     # 2) Inline JSON objects
-    matches = JSON_PATTERN_INLINE.findall(text)
-    objs = []
-    for s in matches:
-        try:
-            objs.append(json.loads(s))
-        except json.JSONDecodeError:
-            continue
-    return objs
+    return extract_json_objects(text)
 
 
 def jaccard_similarity(list1, list2):
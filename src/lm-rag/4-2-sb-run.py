@@ -4,11 +4,12 @@
 import os
 import datetime
 import json
-import re
 import time
 
-import requests
-from clickhouse_driver import Client
+from batch_writer import BatchWriter
+from llm_stream import iter_objects, request_json
+from pipeline import run_pipeline
+from storage import open_storage_from_env
 
 # Load configuration from environment variables
 FASTGPT_API_URL = 'YOUR_FASTGPT_API_URL'
@@ -18,142 +19,107 @@ FASTGPT_API_KEY = 'YOUR_FASTGPT_API_KEY'
 with open(r'data/scale-bar/selected_prompt.txt', 'r', encoding='utf-8') as f:
     FIXED_PROMPT = f.read().strip()
 
-# Initialize ClickHouse client
-client = Client(
-    host='your_host', port='your_port',
-    user='your_username', password='your_password',
-    database='your_database'
-)
+store = open_storage_from_env()
 
 # Table names and schema definitions
 TABLE_INFO = 'scale_bar_all_info'
 TABLE_ENT = 'scale_bar_meta_all_info'
 PRIMARY_KEYS_INFO = ['pmcid', 'id', 'type']
+INFO_IMPORT_COLS = ['pmcid', 'id', 'content', 'type']
 EXPECTED_COLS_INFO = ['pmcid', 'id', 'content', 'type', 'answer']
 
-# Regex pattern for nested JSON
-JSON_PATTERN = r"\{(?:[^{}]|\{(?:[^{}]|\{[^{}]*\})*\})*\}"
+# Concurrency and write batching for the LLM stage
+NUM_WORKERS = 8
+BATCH_SIZE = 500
 
 
 def create_tables():
     """Create both info and entities tables if they don't exist."""
-    ddl_info = f"""
-    CREATE TABLE IF NOT EXISTS {TABLE_INFO} (
-        pmcid String,
-        id String,
-        content String,
-        type String,
-        answer String,
-        update_time DateTime DEFAULT now()
-    ) ENGINE = ReplacingMergeTree(update_time)
-    ORDER BY ({','.join(PRIMARY_KEYS_INFO)});
-    """
-    ddl_ent = f"""
-    CREATE TABLE IF NOT EXISTS {TABLE_ENT} (
-        pmcid String,
-        id String,
-        type String,
-        descriptor_type String,
-        value String,
-        units String,
-        notes String,
-        panel String,
-        update_time DateTime DEFAULT now()
-    ) MergeTree()
-    ORDER BY (pmcid,id,type);
-    """
-    client.execute(ddl_info)
-    client.execute(ddl_ent)
+    store.create_table(TABLE_INFO, {
+        'pmcid': 'String',
+        'id': 'String',
+        'content': 'String',
+        'type': 'String',
+        'answer': 'String',
+        'update_time': 'DateTime DEFAULT now()',
+    }, order_by=PRIMARY_KEYS_INFO, version='update_time')
+    store.create_table(TABLE_ENT, {
+        'pmcid': 'String',
+        'id': 'String',
+        'type': 'String',
+        'descriptor_type': 'String',
+        'value': 'String',
+        'units': 'String',
+        'notes': 'String',
+        'panel': 'String',
+        'update_time': 'DateTime DEFAULT now()',
+    }, order_by=['pmcid', 'id', 'type'])
 
 
 def import_data():
-    """Import source data"""
-    client.execute(f"""
-        INSERT INTO {TABLE_INFO} (pmcid, id, content, type)
-        SELECT pmcid, graphic AS id, caption AS content, 'caption' AS type
+    """Import the source rows not in the info table yet, so answered rows stay answered."""
+    store.insert_missing(TABLE_INFO, INFO_IMPORT_COLS, f"""
+        SELECT a.pmcid AS pmcid, a.graphic AS id, caption AS content, 'caption' AS type
         FROM ftu_pub_pmc a
-        JOIN vision_llm b ON a.pmcid=b.pmcid AND a.graphic=b.graphic
+        JOIN {store.source('vision_llm', 'b', final=True)} ON a.pmcid=b.pmcid AND a.graphic=b.graphic
         WHERE micro='Yes'
-    """)
-    client.execute(f"""
-        INSERT INTO {TABLE_INFO} (pmcid, id, content, type)
-        SELECT pmcid, graphic AS id, ref_text AS content, 'ref_text' AS type
+    """, PRIMARY_KEYS_INFO)
+    store.insert_missing(TABLE_INFO, INFO_IMPORT_COLS, f"""
+        SELECT a.pmcid AS pmcid, a.graphic AS id, ref_text AS content, 'ref_text' AS type
         FROM img_ref a
-        JOIN vision_llm b ON a.pmcid=b.pmcid AND a.graphic=b.graphic
+        JOIN {store.source('vision_llm', 'b', final=True)} ON a.pmcid=b.pmcid AND a.graphic=b.graphic
         WHERE micro='Yes'
-    """)
+    """, PRIMARY_KEYS_INFO)
 
 
-def fetch_pending_info():
-    """Fetch rows from info table where answer is empty."""
-    cols = ', '.join(PRIMARY_KEYS_INFO + ['content'])
-    sql = f"SELECT {cols} FROM {TABLE_INFO} WHERE answer = ''"
-    rows = client.execute(sql)
-    return [dict(zip(PRIMARY_KEYS_INFO + ['content'], r)) for r in rows]
+def count_pending_info():
+    """Count rows in info table where answer is empty."""
+    return store.count(TABLE_INFO, "answer = ''")
 
 
-def extract_json_objects(text):
-    """Extract JSON objects from text using nested-brace regex."""
-    matches = re.findall(JSON_PATTERN, text)
-    objs = []
-    for m in matches:
-        try:
-            objs.append(json.loads(m))
-        except json.JSONDecodeError:
-            continue
-    return objs
+def fetch_pending_info():
+    """Stream rows from info table where answer is empty."""
+    return store.select(TABLE_INFO, PRIMARY_KEYS_INFO + ['content'], "answer = ''")
 
 
 def send_request(row, model='llama3.1:70b'):
-    """Call LLM, parse answer JSON, and upsert into info table."""
+    """Call LLM, parse answer JSON, and return the row to upsert into the info table."""
     payload = {
         'messages': [{'role': 'user', 'content': row['content']}],
         'variables': {'model': model, 'prompt': FIXED_PROMPT}
     }
     headers = {'Authorization': f"Bearer {FASTGPT_API_KEY}", 'Content-Type': 'application/json'}
 
-    ans_objs = []
-    for _ in range(5):
-        resp = requests.post(FASTGPT_API_URL, headers=headers, json=payload)
-        text = resp.json().get('choices', [{}])[0].get('message', {}).get('content', '')
-        ans_objs = extract_json_objects(text)
-        if ans_objs:
-            break
+    # One object per size descriptor and nothing marks the last one, so read to the end
+    text, values, _ = request_json(FASTGPT_API_URL, headers, payload, attempts=5)
+    ans_objs = list(iter_objects(values))
     answer_val = json.dumps(ans_objs, ensure_ascii=False) if ans_objs else text
 
-    vals = (row['pmcid'], row['id'], row['type'], row['content'], answer_val)
-    sql = f"INSERT INTO {TABLE_INFO} ({', '.join(EXPECTED_COLS_INFO)}) VALUES"
-    client.execute(sql, [vals])
+    vals = (row['pmcid'], row['id'], row['content'], row['type'], answer_val)
+    return vals
 
 
 def extract_and_insert_entities():
     """Parse scale-bar metadata from answers and insert into scale_bar_meta_all_info."""
-    sql = f"SELECT pmcid, id, type, answer FROM {TABLE_INFO} WHERE answer != ''"
-    rows = client.execute(sql)
-    ent_records = []
-
-    for pmcid, cid, typ, answer in rows:
-        try:
-            entities = json.loads(answer)
-        except (json.JSONDecodeError, TypeError):
-            continue
-        if isinstance(entities, dict):
-            entities = [entities]
-        for ent in entities:
-            descriptor_type = ent.get('Descriptor Type', '')
-            value = ent.get('Value', '')
-            units = ent.get('Units', '')
-            notes = ent.get('Notes', '')
-            panel = ent.get('Panel', '')
-            ent_records.append((pmcid, cid, typ,
-                                 descriptor_type, value, units, notes, panel))
-
-    if ent_records:
-        insert_sql = (
-            f"INSERT INTO {TABLE_ENT} "
-            "(pmcid, id, type, descriptor_type, value, units, notes, panel) VALUES"
-        )
-        client.execute(insert_sql, ent_records)
+    rows = store.select(TABLE_INFO, ['pmcid', 'id', 'type', 'answer'], "answer != ''", as_dict=False)
+    ent_cols = ['pmcid', 'id', 'type', 'descriptor_type', 'value', 'units', 'notes', 'panel']
+
+    with BatchWriter(store, TABLE_ENT, ent_cols) as ent_writer:
+        for pmcid, cid, typ, answer in rows:
+            try:
+                entities = json.loads(answer)
+            except (json.JSONDecodeError, TypeError):
+                continue
+            if isinstance(entities, dict):
+                entities = [entities]
+            for ent in entities:
+                descriptor_type = ent.get('Descriptor Type', '')
+                value = ent.get('Value', '')
+                units = ent.get('Units', '')
+                notes = ent.get('Notes', '')
+                panel = ent.get('Panel', '')
+                ent_writer.add((pmcid, cid, typ,
+                                descriptor_type, value, units, notes, panel))
 
 
 def main():
@@ -162,9 +128,10 @@ def main():
     # Step 2: Import source info
     import_data()
     # Step 3: Query LLM and upsert answers
-    pending = fetch_pending_info()
-    for row in pending:
-        send_request(row)
+    total = count_pending_info()
+    writer = BatchWriter(store, TABLE_INFO, EXPECTED_COLS_INFO, batch_size=BATCH_SIZE)
+    run_pipeline(fetch_pending_info(), send_request, writer,
+                 workers=NUM_WORKERS, total=total, desc=TABLE_INFO)
     # Step 4: Extract entities and insert into entities table
     extract_and_insert_entities()
 
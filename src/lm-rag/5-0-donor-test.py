@@ -5,25 +5,22 @@ import datetime
 import functools
 import json
 import multiprocessing
-import re
 import time
 import uuid
 
 import pandas as pd
-import requests
-from clickhouse_driver import Client
+
+from batch_writer import BatchWriter
+from ch_stream import batched, prefetch
+from llm_stream import array_of, iter_objects, request_json
+from storage import insert_frame, open_storage_from_env
 
 # File paths and table name configuration
 file1 = r"data\donor-meta\donor-test-answer.csv"
 file2 = r"data\donor-meta\prompt-donor.csv"
 table_name = "donor_test"
 
-# ClickHouse client configuration
-client = Client(
-    host='your_host', port='your_port',
-    user='your_username', password='your_password',
-    database='your_database'
-)
+store = open_storage_from_env()
 
 # Expected columns and primary key order fields
 expected_cols = [
@@ -34,20 +31,21 @@ expected_cols = [
 ]
 order_columds = ['text_type', 'num', 'itype', 'pmcid', 'content', 'prompt']
 
+# Buffered writer for model responses and similarity scores
+writer = BatchWriter(store, table_name, expected_cols, batch_size=1000)
+
+# The answer is complete once the array of donor objects has closed
+DONOR_ANSWER = array_of('species', 'sex', 'age')
+
 # FastGPT API key
 Authorization = 'your_fastgpt_key'
 
 
 def create_table():
-    """Create the ClickHouse table if it does not already exist."""
-    create_table_query = f"""
-    CREATE TABLE IF NOT EXISTS {table_name} (
-        {' String, '.join(expected_cols)} String,
-        update_time DateTime DEFAULT now()
-    ) ENGINE = ReplacingMergeTree(update_time)
-    ORDER BY ({', '.join(order_columds)});
-    """
-    client.execute(create_table_query)
+    """Create the results table if it does not already exist."""
+    columns = {col: 'String' for col in expected_cols}
+    columns['update_time'] = 'DateTime DEFAULT now()'
+    store.create_table(table_name, columns, order_by=order_columds, version='update_time')
 
 
 def import_data():
@@ -64,28 +62,12 @@ def import_data():
     merged[expected_cols] = merged[expected_cols].astype(str)
     merged['update_time'] = datetime.datetime.now()
     all_cols = expected_cols + ['update_time']
-    data = [tuple(row) for row in merged[all_cols].to_numpy()]
-    client.execute(f'INSERT INTO {table_name} VALUES', data)
+    insert_frame(store, table_name, merged, all_cols)
 
 
 def fetch_data_from_clickhouse(condition):
-    """Fetch rows from ClickHouse matching the given SQL condition."""
-    query = f"SELECT {', '.join(expected_cols)} FROM {table_name} {condition}"
-    rows = client.execute(query)
-    return [dict(zip(expected_cols, row)) for row in rows]
-
-
-def extrac_json_text(text):
-    """Extract JSON objects from the model response text."""
-    pattern = r'\{(?:[^{}]|\{(?:[^{}]|\{[^{}]*\})*\})*\}'
-    json_strings = re.findall(pattern, text)
-    objs = []
-    for js in json_strings:
-        try:
-            objs.append(json.loads(js))
-        except json.JSONDecodeError:
-            continue
-    return objs
+    """Stream the latest version of rows matching the given SQL condition."""
+    return prefetch(store.select(table_name, expected_cols, condition))
 
 
 def jaccard_similarity(dict1, dict2, compare_values=True):
@@ -118,7 +100,7 @@ def average_jaccard_similarity(list1, list2, compare_values=True):
 
 
 def process_jaccard(result, column_name):
-    """Compute and store the Jaccard similarity for a given response column."""
+    """Compute the Jaccard similarity for a given response column and return the updated row."""
     answer = result.get('answer', '')
     rs = result.get(column_name, '')
     try:
@@ -131,16 +113,12 @@ def process_jaccard(result, column_name):
         answer_json = {}
     sim = average_jaccard_similarity(answer_json, json_rs)
     result[f'{column_name}_jaccard'] = str(sim)
-    insert_data(result)
+    return result
 
 
 def insert_data(data):
-    """Insert or update a single row in ClickHouse."""
-    row = [data.get(col, '') for col in expected_cols]
-    client.execute(
-        f"INSERT INTO {table_name} ({', '.join(expected_cols)}) VALUES",
-        [tuple(row)]
-    )
+    """Buffer one row for insertion into ClickHouse."""
+    writer.add(tuple(data.get(col, '') for col in expected_cols))
 
 
 def send_request(result, model_name, col_name):
@@ -157,13 +135,8 @@ def send_request(result, model_name, col_name):
         'variables': {'model': model_name, 'prompt': prompt}
     }
     start = time.time()
-    json_rs = []
-    for _ in range(10):
-        res = requests.post(url, headers=headers, data=json.dumps(payload))
-        content = res.json().get('choices', [{}])[0].get('message', {}).get('content', '')
-        json_rs = extrac_json_text(content)
-        if json_rs:
-            break
+    _, values, _ = request_json(url, headers, payload, kinds='{[', is_complete=DONOR_ANSWER, attempts=10)
+    json_rs = list(iter_objects(values))
     runtime = time.time() - start
     result[f'{col_name}_runtime'] = str(round(runtime, 2))
     result[col_name] = json.dumps(json_rs)
@@ -182,15 +155,19 @@ if __name__ == '__main__':
         'llama31': 'llama3.1:70b'
     }
     for col, model in model_map.items():
-        condition = f"WHERE {col} = '' AND prompt != ''"
+        condition = f"{col} = '' AND prompt != ''"
         tasks = fetch_data_from_clickhouse(condition)
         for task in tasks:
             send_request(task, model, col)
+        writer.flush()
 
     # Step 3: Parallel computation of record-level Jaccard similarity
     for col in model_map:
-        condition = f"WHERE {col} != '' AND {col}_jaccard = ''"
+        condition = f"{col} != '' AND {col}_jaccard = ''"
         tasks = fetch_data_from_clickhouse(condition)
         worker = functools.partial(process_jaccard, column_name=col)
         with multiprocessing.Pool(processes=20) as pool:
-            pool.map(worker, tasks)
+            for chunk in batched(tasks, 10000):
+                for result in pool.imap_unordered(worker, chunk, chunksize=50):
+                    insert_data(result)
+        writer.flush()
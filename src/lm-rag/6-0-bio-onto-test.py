@@ -5,25 +5,22 @@ import datetime
 import functools
 import json
 import multiprocessing
-import re
 import time
 import uuid
 
 import pandas as pd
-import requests
-from clickhouse_driver import Client
+
+from batch_writer import BatchWriter
+from ch_stream import batched, prefetch
+from llm_stream import has_keys, iter_objects, request_json
+from storage import insert_frame, open_storage_from_env
 
 # File paths and table name configuration
 file1 = r"data\bio-onto\bio-onto-test-answer.csv"
 file2 = r"data\bio-onto\bio-onto-prompt.csv"
 table_name = "bio_test"
 
-# ClickHouse client configuration
-client = Client(
-    host='your_host', port='your_port',
-    user='your_username', password='your_password',
-    database='your_database'
-)
+store = open_storage_from_env()
 
 # Expected columns and primary key order fields
 expected_cols = [
@@ -34,20 +31,21 @@ expected_cols = [
 ]
 order_columds = ['text_type', 'num', 'itype', 'pmcid', 'content', 'prompt']
 
+# Buffered writer for model responses and similarity scores
+writer = BatchWriter(store, table_name, expected_cols, batch_size=1000)
+
+# The answer is complete once an object with the entity list has closed
+ENTITY_ANSWER = has_keys('entities')
+
 # FastGPT API key
 Authorization = 'your_fastgpt_key'
 
 
 def create_table():
-    """Create the ClickHouse table if it does not already exist."""
-    create_table_query = f"""
-    CREATE TABLE IF NOT EXISTS {table_name} (
-        {' String, '.join(expected_cols)} String,
-        update_time DateTime DEFAULT now()
-    ) ENGINE = ReplacingMergeTree(update_time)
-    ORDER BY ({', '.join(order_columds)});
-    """
-    client.execute(create_table_query)
+    """Create the results table if it does not already exist."""
+    columns = {col: 'String' for col in expected_cols}
+    columns['update_time'] = 'DateTime DEFAULT now()'
+    store.create_table(table_name, columns, order_by=order_columds, version='update_time')
 
 
 def import_data():
@@ -67,28 +65,12 @@ def import_data():
     merged['update_time'] = datetime.datetime.now()
     # Reorder columns and bulk insert into ClickHouse
     all_cols = expected_cols + ['update_time']
-    data = [tuple(row) for row in merged[all_cols].to_numpy()]
-    client.execute(f'INSERT INTO {table_name} VALUES', data)
+    insert_frame(store, table_name, merged, all_cols)
 
 
 def fetch_data_from_clickhouse(condition):
-    """Fetch rows from ClickHouse matching the given SQL condition."""
-    query = f"SELECT {', '.join(expected_cols)} FROM {table_name} {condition}"
-    rows = client.execute(query)
-    return [dict(zip(expected_cols, row)) for row in rows]
-
-
-def extrac_json_text(text):
-    """Extract JSON objects from the model response text."""
-    pattern = r'\{(?:[^{}]|\{(?:[^{}]|\{[^{}]*\})*\})*\}'
-    json_strings = re.findall(pattern, text)
-    objs = []
-    for js in json_strings:
-        try:
-            objs.append(json.loads(js))
-        except json.JSONDecodeError:
-            continue
-    return objs
+    """Stream the latest version of rows matching the given SQL condition."""
+    return prefetch(store.select(table_name, expected_cols, condition))
 
 
 def jaccard_similarity_list(list1, list2):
@@ -104,12 +86,8 @@ def jaccard_similarity_list(list1, list2):
 
 
 def insert_data(data):
-    """Insert or update a single row in ClickHouse."""
-    row = [data.get(col, '') for col in expected_cols]
-    client.execute(
-        f"INSERT INTO {table_name} ({', '.join(expected_cols)}) VALUES",
-        [tuple(row)]
-    )
+    """Buffer one row for insertion into ClickHouse."""
+    writer.add(tuple(data.get(col, '') for col in expected_cols))
 
 
 def send_request(result, model_name, col_name):
@@ -126,13 +104,8 @@ def send_request(result, model_name, col_name):
         'variables': {'model': model_name, 'prompt': prompt}
     }
     start = time.time()
-    json_rs = []
-    for _ in range(10):
-        res = requests.post(url, headers=headers, data=json.dumps(payload))
-        content = res.json().get('choices', [{}])[0].get('message', {}).get('content', '')
-        json_rs = extrac_json_text(content)
-        if json_rs:
-            break
+    _, values, _ = request_json(url, headers, payload, is_complete=ENTITY_ANSWER, attempts=10)
+    json_rs = list(iter_objects(values))
     runtime = time.time() - start
     result[f'{col_name}_runtime'] = str(round(runtime, 2))
     result[col_name] = json.dumps(json_rs)
@@ -140,7 +113,7 @@ def send_request(result, model_name, col_name):
 
 
 def process_entities_jaccard(result, column_name):
-    """Compute and write back Jaccard similarity for the 'entities' list."""
+    """Compute Jaccard similarity for the 'entities' list and return the updated row."""
     try:
         ans_json = json.loads(result.get('answer', ''))
     except:
@@ -156,7 +129,7 @@ def process_entities_jaccard(result, column_name):
     else:
         sim = 0
     result[f'{column_name}_jaccard'] = str(sim)
-    insert_data(result)
+    return result
 
 
 if __name__ == '__main__':
@@ -172,15 +145,19 @@ if __name__ == '__main__':
         'llama31': 'llama3.1:70b'
     }
     for col, model in model_map.items():
-        condition = f"WHERE {col} = '' AND prompt != ''"
+        condition = f"{col} = '' AND prompt != ''"
         tasks = fetch_data_from_clickhouse(condition)
         for task in tasks:
             send_request(task, model, col)
+        writer.flush()
 
     # Step 3: Parallel computation of entity-level Jaccard similarity
     for col in model_map:
-        condition = f"WHERE {col} != '' AND {col}_jaccard = ''"
+        condition = f"{col} != '' AND {col}_jaccard = ''"
         tasks = fetch_data_from_clickhouse(condition)
         worker = functools.partial(process_entities_jaccard, column_name=col)
         with multiprocessing.Pool(processes=20) as pool:
-            pool.map(worker, tasks)
+            for chunk in batched(tasks, 10000):
+                for result in pool.imap_unordered(worker, chunk, chunksize=50):
+                    insert_data(result)
+        writer.flush()
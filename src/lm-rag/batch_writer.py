@@ -0,0 +1,88 @@
+"""
+Buffered table writer.
+Accumulates rows and flushes them as one columnar INSERT when a size or time threshold is
+reached, so each flush creates one data part instead of one part per row. Failed flushes are
+retried with the same insert_deduplication_token, which makes a retry of a batch that did
+reach the ClickHouse server a no-op (the SQLite stand-in replaces rows by key instead).
+"""
+import hashlib
+import threading
+import time
+
+
+class BatchWriter:
+    """Accumulate rows for one table and insert them in large columnar batches."""
+
+    def __init__(self, store, table, columns, batch_size=5000, flush_interval=10.0,
+                 retries=5, backoff=2.0):
+        self.store = store
+        self.table = table
+        self.columns = list(columns)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.backoff = backoff
+        self.written = 0
+        self._buf = []
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add(self, row):
+        """Buffer one row (tuple in column order, or dict keyed by column name)."""
+        if isinstance(row, dict):
+            row = tuple(row.get(col, '') for col in self.columns)
+        with self._lock:
+            self._buf.append(row)
+            due = len(self._buf) >= self.batch_size
+        if due:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def add_many(self, rows):
+        for row in rows:
+            self.add(row)
+
+    def flush_if_due(self):
+        """Flush when the time threshold has passed since the last flush."""
+        if self._buf and time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Insert everything buffered so far as one columnar batch."""
+        with self._lock:
+            batch, self._buf = self._buf, []
+            self._last_flush = time.time()
+        if not batch:
+            return 0
+        try:
+            self._insert(batch)
+        except Exception:
+            with self._lock:
+                self._buf[:0] = batch
+            raise
+        self.written += len(batch)
+        return len(batch)
+
+    def close(self):
+        self.flush()
+
+    def _insert(self, batch):
+        token = hashlib.sha1(repr(batch).encode('utf-8')).hexdigest()
+        for attempt in range(1, self.retries + 1):
+            try:
+                self.store.insert(self.table, self.columns, batch, dedup_token=token)
+                return
+            except Exception as e:
+                if attempt == self.retries:
+                    print(f"[{self.table}] Insert of {len(batch)} rows failed after {attempt} attempts: {e}")
+                    raise
+                wait = self.backoff ** attempt
+                print(f"[{self.table}] Insert of {len(batch)} rows failed ({e}), retrying in {wait:.0f}s...")
+                time.sleep(wait)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark: nested-brace regex versus the single-pass json_scan extractor.
+The corpus is the model answers in the test-answer CSVs plus synthetic stress cases: a long
+unbalanced generation (many unclosed braces, as in truncated 3000-token outputs) and objects
+nested deeper than the regex's three levels.
+    python src/lm-rag/bench-json-extract.py
+"""
+import argparse
+import csv
+import json
+import re
+import sys
+import time
+
+from json_scan import extract_json_objects
+
+JSON_PATTERN = re.compile(r'\{(?:[^{}]|\{(?:[^{}]|\{[^{}]*\})*\})*\}')
+
+ANSWER_FILES = [
+    ('data/bio-onto/bio-onto-test-answer.csv', 'answer'),
+    ('data/donor-meta/donor-test-answer.csv', 'answer'),
+    ('data/img-entity/lvm-test-answer.csv', 'nodes'),
+]
+
+
+def regex_extract(text):
+    objs = []
+    for m in JSON_PATTERN.findall(text):
+        try:
+            objs.append(json.loads(m))
+        except json.JSONDecodeError:
+            continue
+    return objs
+
+
+def load_corpus(files):
+    csv.field_size_limit(sys.maxsize)
+    corpus = []
+    for path, column in files:
+        try:
+            with open(path, newline='', encoding='utf-8', errors='replace') as f:
+                corpus += [row[column] for row in csv.DictReader(f) if row.get(column)]
+        except FileNotFoundError:
+            print(f"Skipping missing corpus file {path}")
+    return corpus
+
+
+def stress_cases(tokens):
+    deep = {'entities': [{'name': 'Nephron', 'parts': [{'name': 'Glomerulus', 'cells': [{'name': 'Podocyte'}]}]}]}
+    return {
+        'unbalanced': 'The figure shows { a tissue section with { labelled regions ' * (tokens // 10)
+                      + json.dumps({'entities': ['Liver']}),
+        'deep nesting': 'Answer:\n' + json.dumps(deep, indent=2),
+    }
+
+
+def timed(fn, texts, repeat):
+    """Best wall time over `repeat` runs, objects found and JSON characters they cover."""
+    best, objs = float('inf'), []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        objs = [o for t in texts for o in fn(t)]
+        best = min(best, time.perf_counter() - start)
+    return best, len(objs), sum(len(json.dumps(o)) for o in objs)
+
+
+def main(args):
+    corpus = load_corpus(ANSWER_FILES)
+    print(f"Corpus: {len(corpus)} responses, {sum(map(len, corpus)) / 1e6:.2f} MB")
+    cases = {'real responses': corpus}
+    cases.update({k: [v] for k, v in stress_cases(args.tokens).items()})
+
+    print(f"{'case':<16}{'regex s':>10}{'objs':>6}{'chars':>8}{'scanner s':>11}{'objs':>6}{'chars':>8}{'speedup':>9}")
+    for name, texts in cases.items():
+        t_re, n_re, c_re = timed(regex_extract, texts, args.repeat)
+        t_sc, n_sc, c_sc = timed(extract_json_objects, texts, args.repeat)
+        print(f"{name:<16}{t_re:>10.4f}{n_re:>6}{c_re:>8}{t_sc:>11.4f}{n_sc:>6}{c_sc:>8}{t_re / t_sc:>8.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare regex and single-pass JSON extraction')
+    parser.add_argument('--tokens', type=int, default=3000, help='Approximate length of the unbalanced case')
+    parser.add_argument('--repeat', type=int, default=3)
+    main(parser.parse_args())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-row ALTER TABLE ... UPDATE mutations versus batched versioned inserts into a
+ReplacingMergeTree, the two ways 2-3-itype-run.py / 3-2-lvm-entity-run.py can record results.
+Run it against a throwaway local server, e.g.
+    docker run -d -p 9000:9000 clickhouse/clickhouse-server
+    python src/lm-rag/bench-mutation-vs-insert.py --clickhouse-host localhost
+or, without a server, against the embedded SQLite stand-in (per-row UPDATE vs batched upserts):
+    python src/lm-rag/bench-mutation-vs-insert.py --backend sqlite
+"""
+import argparse
+import time
+import uuid
+
+from batch_writer import BatchWriter
+from storage import add_storage_args, open_storage_from_args
+
+COLS = ['pmcid', 'graphic', 'file_path', 'nodes']
+SCHEMA = {**{c: 'String' for c in COLS}, 'update_time': 'DateTime DEFAULT now()'}
+KEY = ['pmcid', 'graphic', 'file_path']
+
+
+def make_rows(n):
+    return [(f"PMC{i}", f"fig{i}", f"ftu-pub-pmc/PMC{i}/fig{i}.jpg", '') for i in range(n)]
+
+
+def setup_table(store, table, rows):
+    store.execute(f"DROP TABLE IF EXISTS {table}")
+    store.create_table(table, SCHEMA, order_by=KEY, version='update_time')
+    store.insert(table, COLS, rows)
+
+
+def answer_for(row):
+    return f'[{{"entities": ["{row[0]} entity", "{uuid.uuid4().hex[:8]}"]}}]'
+
+
+def run_mutations(store, table, rows):
+    """One ALTER TABLE UPDATE per row (a plain UPDATE on SQLite), then wait until every mutation has been applied."""
+    if store.dialect == 'sqlite':
+        update, now = f"UPDATE {table} SET", "CURRENT_TIMESTAMP"
+    else:
+        update, now = f"ALTER TABLE {table} UPDATE", "now()"
+    start = time.time()
+    for row in rows:
+        nodes = answer_for(row).replace("'", "''")
+        store.execute(
+            f"{update} nodes = '{nodes}', update_time = {now} "
+            f"WHERE pmcid = '{row[0]}' AND graphic = '{row[1]}' AND file_path = '{row[2]}'"
+        )
+    while store.dialect == 'clickhouse' and store.execute(
+        "SELECT count() FROM system.mutations WHERE database = currentDatabase() "
+        f"AND table = '{table}' AND is_done = 0"
+    )[0][0]:
+        time.sleep(0.2)
+    return time.time() - start
+
+
+def run_versioned_inserts(store, table, rows, batch_size):
+    """Write a new version of each row through BatchWriter and read it back with FINAL."""
+    start = time.time()
+    with BatchWriter(store, table, COLS, batch_size=batch_size) as writer:
+        for row in rows:
+            writer.add(row[:3] + (answer_for(row),))
+    done = store.count(table, "nodes != ''")
+    elapsed = time.time() - start
+    if done != len(rows):
+        print(f"Warning: expected {len(rows)} updated rows in {table}, found {done}")
+    return elapsed
+
+
+def main(args):
+    store = open_storage_from_args(args)
+    rows = make_rows(args.rows)
+    sample = rows[:args.mutation_rows]
+
+    setup_table(store, 'bench_mutation', rows)
+    t_mut = run_mutations(store, 'bench_mutation', sample)
+
+    setup_table(store, 'bench_versioned', rows)
+    t_ins = run_versioned_inserts(store, 'bench_versioned', rows, args.batch_size)
+
+    print(f"Table size: {len(rows)} rows")
+    print(f"ALTER UPDATE : {len(sample):>8} rows in {t_mut:8.2f}s -> {len(sample) / t_mut:10.1f} rows/s")
+    print(f"Versioned ins: {len(rows):>8} rows in {t_ins:8.2f}s -> {len(rows) / t_ins:10.1f} rows/s")
+
+    if not args.keep_tables:
+        store.execute("DROP TABLE IF EXISTS bench_mutation")
+        store.execute("DROP TABLE IF EXISTS bench_versioned")
+    store.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare ALTER UPDATE mutations with versioned inserts')
+    add_storage_args(parser, sqlite_path='bench.sqlite')
+    parser.add_argument('--rows', type=int, default=20000, help='Rows in each table')
+    parser.add_argument('--mutation-rows', type=int, default=500,
+                        help='Rows updated through mutations (they are slow; rate is extrapolated)')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--keep-tables', action='store_true')
+    main(parser.parse_args())
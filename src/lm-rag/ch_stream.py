@@ -0,0 +1,65 @@
+"""
+Streaming ClickHouse reads.
+stream_rows iterates a SELECT block by block with execute_iter instead of materializing the
+whole result, and prefetch keeps a bounded number of rows buffered from a background thread
+so processing starts with the first block and memory stays flat regardless of backlog size.
+
+A client that is streaming a result cannot run other queries until the stream is exhausted,
+so use a dedicated client for streamed reads.
+"""
+import itertools
+import queue
+import threading
+
+_DONE = object()
+
+
+def stream_rows(client, sql, columns=None, block_size=10000, params=None):
+    """Yield rows of `sql` as they arrive; dicts keyed by `columns` when given."""
+    settings = {'max_block_size': block_size}
+    for row in client.execute_iter(sql, params, settings=settings):
+        yield dict(zip(columns, row)) if columns else row
+
+
+def prefetch(iterable, maxsize=1000):
+    """Iterate `iterable` in a background thread, buffering at most `maxsize` items."""
+    buf = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def producer():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        buf.put(item, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            buf.put(_DONE)
+        except BaseException as e:
+            buf.put(e)
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buf.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def batched(iterable, n):
+    """Yield lists of up to `n` items from `iterable`."""
+    it = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(it, n))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,177 @@
+"""
+Single-pass JSON extraction from model responses.
+JsonScanner walks the text once, tracking brace/bracket depth and string escapes, and returns
+each balanced top-level object (or array) as soon as its closing bracket arrives, so it can be
+fed a streamed response chunk by chunk. Unlike the nested-brace regex it has no nesting limit
+and does not backtrack on long unbalanced generations: an unclosed, mismatched or unparsable
+container is dropped and the complete containers inside it are still recovered, by walking
+the child spans recorded during the scan rather than rescanning the text. The scan itself is
+linear; each container enclosing an invalid span costs one more parse attempt. Candidates that
+are already valid JSON are decoded directly by the C decoder, so well-formed answers cost one
+call; values nested deeper than the decoder's recursion limit are recovered from their children.
+
+Candidates that are not strict JSON go through loads_lenient (trailing commas, curly quotes,
+Python-style literals such as single-quoted strings or True/None).
+"""
+import ast
+import json
+import re
+
+_CLOSERS = {'{': '}', '[': ']'}
+# A complete string literal in one match, a bracket, or a quote opening a string not yet complete
+_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\]"]', re.DOTALL)
+_STRING_END = re.compile(r'["\\]')
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+_CURLY_QUOTES = str.maketrans({'“': '"', '”': '"', '‘': "'", '’': "'"})
+_STARTS = {}
+_DECODER = json.JSONDecoder()
+
+
+def loads_lenient(text):
+    """json.loads, falling back to light repairs; raises ValueError if nothing parses."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    repaired = _TRAILING_COMMA.sub(r'\1', text.translate(_CURLY_QUOTES))
+    try:
+        return json.loads(repaired)
+    except json.JSONDecodeError:
+        pass
+    try:
+        value = ast.literal_eval(repaired)
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        value = None
+    if isinstance(value, (dict, list)):
+        return value
+    raise ValueError(f"Not a JSON value: {text[:80]!r}")
+
+
+class JsonScanner:
+    """
+    Incremental extractor of top-level JSON values.
+
+    kinds   -- opening brackets that start a candidate: '{' for objects, '[' for arrays
+    lenient -- parse candidates with loads_lenient instead of json.loads
+
+    feed(chunk) returns the values completed by that chunk; close() returns whatever can still
+    be recovered from an unfinished tail.
+    """
+
+    def __init__(self, kinds='{', lenient=True):
+        self.kinds = kinds
+        self.lenient = lenient
+        if kinds not in _STARTS:
+            _STARTS[kinds] = re.compile('[' + re.escape(kinds) + ']')
+        self._start = _STARTS[kinds]
+        self._buf = ''
+        self._pos = 0
+        self._in_string = False
+        # Open containers: [start offset, expected closer, completed children]; a completed
+        # container is a (start, end, children) span
+        self._stack = []
+
+    def feed(self, chunk):
+        self._buf += chunk
+        buf, pos, stack = self._buf, self._pos, self._stack
+        out = []
+        while True:
+            if not stack:
+                m = self._start.search(buf, pos)
+                if not m:
+                    pos = len(buf)
+                    break
+                # Fast path: a candidate that is already valid JSON is decoded in one C call
+                try:
+                    value, pos = _DECODER.raw_decode(buf, m.start())
+                except (ValueError, RecursionError):
+                    stack.append([m.start(), _CLOSERS[m.group()], []])
+                    pos = m.end()
+                    continue
+                out.append(value)
+                continue
+            if self._in_string:
+                m = _STRING_END.search(buf, pos)
+                if not m:
+                    pos = len(buf)
+                    break
+                if m.group() == '\\':
+                    if m.end() >= len(buf):
+                        # Escaped character not received yet
+                        pos = m.start()
+                        break
+                    pos = m.end() + 1
+                    continue
+                self._in_string = False
+                pos = m.end()
+                continue
+            m = _TOKEN.search(buf, pos)
+            if not m:
+                pos = len(buf)
+                break
+            c = m.group()
+            pos = m.end()
+            if c[0] == '"':
+                self._in_string = len(c) == 1
+            elif c in _CLOSERS:
+                stack.append([m.start(), _CLOSERS[c], []])
+            elif c != stack[-1][1]:
+                # Mismatched closer: give up on every open container, keep their complete children
+                out.extend(self._salvage(buf, stack))
+                stack.clear()
+            else:
+                start, _, children = stack.pop()
+                if stack:
+                    stack[-1][2].append((start, pos, children))
+                else:
+                    out.extend(self._emit(buf, [(start, pos, children)]))
+
+        if not stack:
+            # Nothing open: the scanned text is no longer needed
+            buf, pos = '', 0
+        self._buf, self._pos = buf, pos
+        return out
+
+    def close(self):
+        out = self._salvage(self._buf, self._stack)
+        self._buf, self._pos, self._in_string, self._stack = '', 0, False, []
+        return out
+
+    def _parse(self, text):
+        return loads_lenient(text) if self.lenient else json.loads(text)
+
+    def _emit(self, buf, spans):
+        """Parse balanced spans in order; in place of one that is not valid, its children."""
+        out = []
+        pending = list(reversed(spans))
+        while pending:
+            start, end, children = pending.pop()
+            if buf[start] in self.kinds:
+                try:
+                    out.append(self._parse(buf[start:end]))
+                    continue
+                except (ValueError, RecursionError):
+                    pass
+            pending.extend(reversed(children))
+        return out
+
+    def _salvage(self, buf, stack):
+        return self._emit(buf, [span for _, _, children in stack for span in children])
+
+
+def scan_json(text, kinds='{', lenient=True):
+    """All top-level JSON values in `text` whose opening bracket is in `kinds`."""
+    scanner = JsonScanner(kinds, lenient)
+    return scanner.feed(text or '') + scanner.close()
+
+
+def extract_json_objects(text):
+    """JSON objects (dicts) found in a model response, in order of appearance."""
+    return scan_json(text, '{')
+
+
+def first_json_array(text):
+    """The first JSON array in a model response, or [] if there is none."""
+    for value in scan_json(text, '['):
+        return value
+    return []
@@ -0,0 +1,96 @@
+"""
+Streaming chat completions with early stop.
+The response is requested with stream=True and each content delta is fed to a JsonScanner.
+As soon as the values received so far satisfy `is_complete` (e.g. an object carrying the
+expected keys) the connection is closed, which makes the model server abort the generation,
+so a row no longer pays for the tokens the model produces after its answer. Only a request
+whose response held no complete answer is sent again.
+
+Works with OpenAI-style SSE chunks ("data: {choices: [{delta: {content}}]}", as FastGPT
+sends them) and with Ollama's NDJSON stream ({"message": {"content"}}).
+"""
+import json
+
+import requests
+
+from json_scan import JsonScanner
+
+
+def has_keys(*keys):
+    """is_complete predicate: some received object (or object in a received array) has all `keys`."""
+    def is_complete(values):
+        return any(all(k in obj for k in keys) for obj in iter_objects(values))
+    return is_complete
+
+
+def array_of(*keys):
+    """is_complete predicate for answers that are one array of objects having all `keys`."""
+    def is_complete(values):
+        return any(isinstance(v, list) and has_keys(*keys)([v]) for v in values)
+    return is_complete
+
+
+def iter_objects(values):
+    """Objects among `values`, with arrays of objects flattened."""
+    for value in values:
+        if isinstance(value, dict):
+            yield value
+        elif isinstance(value, list):
+            yield from (v for v in value if isinstance(v, dict))
+
+
+def _chunk_content(line):
+    if line.startswith('data:'):
+        line = line[5:].strip()
+    if not line or line == '[DONE]':
+        return ''
+    try:
+        chunk = json.loads(line)
+    except json.JSONDecodeError:
+        return ''
+    if 'choices' in chunk:
+        choice = (chunk['choices'] or [{}])[0]
+        return (choice.get('delta') or choice.get('message') or {}).get('content') or ''
+    return (chunk.get('message') or {}).get('content') or ''
+
+
+def stream_completion(url, headers, payload, kinds='{', is_complete=None, timeout=(10, 600)):
+    """
+    Stream one completion and return (text, values) where values are the JSON values found.
+    Stops reading once `is_complete(values)` is true; without a predicate the whole response is read.
+    """
+    scanner = JsonScanner(kinds)
+    parts, values = [], []
+    with requests.post(url, headers=headers, json=dict(payload, stream=True),
+                       stream=True, timeout=timeout) as resp:
+        resp.raise_for_status()
+        for line in resp.iter_lines(decode_unicode=True):
+            piece = _chunk_content(line or '')
+            if not piece:
+                continue
+            parts.append(piece)
+            values.extend(scanner.feed(piece))
+            if is_complete and is_complete(values):
+                # Leaving the block closes the connection and cancels the rest of the generation
+                return ''.join(parts), values
+    values.extend(scanner.close())
+    return ''.join(parts), values
+
+
+def request_json(url, headers, payload, kinds='{', is_complete=None, attempts=5):
+    """
+    stream_completion with retries: a request is sent again only when its response held no
+    JSON value at all. Returns (text, values, attempts used).
+    Connection errors are retried too; the last one is raised.
+    """
+    text, values = '', []
+    for attempt in range(1, attempts + 1):
+        try:
+            text, values = stream_completion(url, headers, payload, kinds, is_complete)
+        except requests.RequestException:
+            if attempt == attempts:
+                raise
+            continue
+        if values:
+            return text, values, attempt
+    return text, values, attempts
@@ -0,0 +1,167 @@
+"""
+Pipelined worker engine for the ClickHouse-backed LLM runners.
+A reader thread streams pending rows into a bounded queue, N worker threads send them to the
+model, and a writer thread hands the results to a BatchWriter.
+"""
+import queue
+import signal
+import threading
+import time
+
+_DONE = object()
+
+
+class Progress:
+    """Thread-safe counters with periodic rate/ETA reporting."""
+
+    def __init__(self, total=None, desc='Rows', every=10.0):
+        self.total = total
+        self.desc = desc
+        self.every = every
+        self.done = 0
+        self.failed = 0
+        self.written = 0
+        self.start = time.time()
+        self._last = self.start
+        self._lock = threading.Lock()
+
+    def update(self, ok=True):
+        with self._lock:
+            self.done += 1
+            if not ok:
+                self.failed += 1
+            now = time.time()
+            if now - self._last >= self.every:
+                self._last = now
+                print(self.summary())
+
+    def add_written(self, n):
+        with self._lock:
+            self.written += n
+
+    def summary(self):
+        elapsed = time.time() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        msg = f"[{self.desc}] {self.done}"
+        if self.total:
+            msg += f"/{self.total}"
+        msg += f" done, {self.failed} failed, {self.written} written, {rate:.2f} rows/s"
+        if self.total and rate > 0:
+            eta = (self.total - self.done) / rate
+            msg += f", ETA {format_eta(eta)}"
+        return msg
+
+
+def format_eta(seconds):
+    """Format a duration in seconds as H:MM:SS."""
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def run_pipeline(rows, handler, writer, workers=8, total=None, desc='Rows', report_every=10.0):
+    """
+    Run `handler` over `rows` with `workers` concurrent threads and persist results via `writer`.
+
+    rows    -- iterable of pending rows (consumed lazily by the reader thread)
+    handler -- function(row) -> result or None; None results are not written
+    writer  -- BatchWriter (or anything with add/flush_if_due/close), used from one thread only
+
+    Ctrl-C stops the reader, lets in-flight rows finish and flushes the partial batch.
+    A write that still fails after the writer's retries stops the run the same way and is
+    raised once the threads have finished; the unwritten rows stay pending for the next run.
+    Returns the Progress object with the final counters.
+    """
+    in_q = queue.Queue(maxsize=workers * 4)
+    out_q = queue.Queue(maxsize=workers * 64)
+    stop = threading.Event()
+    progress = Progress(total=total, desc=desc, every=report_every)
+    write_errors = []
+
+    def reader():
+        try:
+            for row in rows:
+                while not stop.is_set():
+                    try:
+                        in_q.put(row, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    break
+        except Exception as e:
+            print(f"[{desc}] Reader failed: {e}")
+            stop.set()
+        finally:
+            for _ in range(workers):
+                in_q.put(_DONE)
+
+    def worker():
+        while True:
+            row = in_q.get()
+            if row is _DONE:
+                break
+            if stop.is_set():
+                continue
+            try:
+                result = handler(row)
+            except Exception as e:
+                print(f"[{desc}] Worker error: {e}")
+                progress.update(ok=False)
+                continue
+            if result is not None:
+                out_q.put(result)
+            progress.update(ok=result is not None)
+
+    def write(step):
+        if write_errors:
+            # Keep draining the results so the workers can finish, but stop writing
+            return
+        before = writer.written
+        try:
+            step()
+        except Exception as e:
+            print(f"[{desc}] Write failed, stopping: {e}")
+            write_errors.append(e)
+            stop.set()
+        progress.add_written(writer.written - before)
+
+    def write_loop():
+        while True:
+            try:
+                item = out_q.get(timeout=0.5)
+            except queue.Empty:
+                write(writer.flush_if_due)
+                continue
+            if item is _DONE:
+                break
+            write(lambda: writer.add(item))
+        write(writer.close)
+
+    previous_handler = None
+    if threading.current_thread() is threading.main_thread():
+        def on_sigint(signum, frame):
+            print(f"[{desc}] Interrupt received, finishing in-flight rows and flushing...")
+            stop.set()
+        previous_handler = signal.signal(signal.SIGINT, on_sigint)
+
+    threads = [threading.Thread(target=reader, daemon=True)]
+    threads += [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    writer_thread = threading.Thread(target=write_loop, daemon=True)
+    for t in threads:
+        t.start()
+    writer_thread.start()
+    try:
+        for t in threads:
+            while t.is_alive():
+                t.join(timeout=0.5)
+        out_q.put(_DONE)
+        while writer_thread.is_alive():
+            writer_thread.join(timeout=0.5)
+    finally:
+        if previous_handler is not None:
+            signal.signal(signal.SIGINT, previous_handler)
+
+    print(progress.summary())
+    if write_errors:
+        raise RuntimeError(f"[{desc}] Results could not be written") from write_errors[0]
+    return progress
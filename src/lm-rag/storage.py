@@ -0,0 +1,349 @@
+"""
+Storage backends for the ClickHouse-dependent pipelines.
+Both backends expose the same small interface (table DDL, batched insert, streaming select,
+upsert, insert of missing keys, delete and raw execute), so a pipeline can run against the
+ClickHouse server or, for tests and benchmarks on one machine, against an embedded SQLite file.
+
+Tables are declared with ClickHouse column types. `version` makes a table a
+ReplacingMergeTree(version) on ClickHouse and gives it a primary key on `order_by` in
+SQLite, where inserts replace the existing row with the same key. Reads through `select`
+and `count` return the latest version of each row on both backends.
+
+Scripts with a command line take the backend options of add_storage_args; scripts without
+one read the same options from environment variables, e.g. HRA_RAG_BACKEND=sqlite or
+HRA_RAG_CLICKHOUSE_HOST for --clickhouse-host (open_storage_from_env).
+"""
+import argparse
+import datetime
+import os
+import sqlite3
+import threading
+
+from ch_stream import stream_rows
+
+
+def open_storage(backend='clickhouse', **config):
+    """Open a storage backend: 'clickhouse' (host, port, user, password, database) or 'sqlite' (path)."""
+    if backend == 'clickhouse':
+        return ClickHouseStorage(**config)
+    if backend == 'sqlite':
+        return SQLiteStorage(**config)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def add_storage_args(parser, sqlite_path='hra_rag_ftu.sqlite'):
+    """The --backend, --sqlite-path and --clickhouse-* options read by open_storage_from_args."""
+    parser.add_argument('--backend', choices=['clickhouse', 'sqlite'], default='clickhouse',
+                        help='Storage backend.')
+    parser.add_argument('--sqlite-path', default=sqlite_path, help='Database file for the sqlite backend.')
+    parser.add_argument('--clickhouse-host', default='localhost', help='ClickHouse host.')
+    parser.add_argument('--clickhouse-port', type=int, default=9000, help='ClickHouse port.')
+    parser.add_argument('--clickhouse-user', default='default', help='ClickHouse username.')
+    parser.add_argument('--clickhouse-password', default='', help='ClickHouse password.')
+    parser.add_argument('--clickhouse-database', default='default', help='ClickHouse database name.')
+    return parser
+
+
+def storage_config(args):
+    """open_storage keyword arguments from the options of add_storage_args."""
+    if args.backend == 'sqlite':
+        return dict(backend='sqlite', path=args.sqlite_path)
+    return dict(backend='clickhouse', host=args.clickhouse_host, port=args.clickhouse_port,
+                user=args.clickhouse_user, password=args.clickhouse_password,
+                database=args.clickhouse_database)
+
+
+def open_storage_from_args(args):
+    return open_storage(**storage_config(args))
+
+
+ENV_PREFIX = 'HRA_RAG_'
+
+
+def storage_args_from_env(sqlite_path='hra_rag_ftu.sqlite', environ=None):
+    """The options of add_storage_args, each set from ENV_PREFIX + its name in upper case if present."""
+    environ = os.environ if environ is None else environ
+    parser = add_storage_args(argparse.ArgumentParser(add_help=False), sqlite_path)
+    argv = [f"--{dest.replace('_', '-')}={environ[ENV_PREFIX + dest.upper()]}"
+            for dest in vars(parser.parse_args([])) if ENV_PREFIX + dest.upper() in environ]
+    return parser.parse_args(argv)
+
+
+def open_storage_from_env(sqlite_path='hra_rag_ftu.sqlite'):
+    return open_storage_from_args(storage_args_from_env(sqlite_path))
+
+
+def quote(column):
+    return f"`{column}`"
+
+
+class ClickHouseStorage:
+    dialect = 'clickhouse'
+
+    def __init__(self, **config):
+        from clickhouse_driver import Client
+        self._client_cls = Client
+        self.config = config
+        self.client = Client(**config)
+
+    def name(self, table):
+        return table
+
+    def source(self, table, alias=None, final=False):
+        """FROM-clause fragment for `table`, reading the latest versions when `final`."""
+        frag = table + (f" AS {alias}" if alias else "")
+        return frag + (" FINAL" if final else "")
+
+    def create_table(self, table, columns, order_by, version=None, partition_by=None):
+        """Create `table` with `columns` ({name: ClickHouse type}) if it does not exist."""
+        cols = ',\n    '.join(f"{quote(c)} {t}" for c, t in columns.items())
+        engine = f"ReplacingMergeTree({version})" if version else "MergeTree()"
+        ddl = f"CREATE TABLE IF NOT EXISTS {table} (\n    {cols}\n) ENGINE = {engine}\n"
+        if partition_by:
+            ddl += f"PARTITION BY {partition_by}\n"
+        ddl += f"ORDER BY ({', '.join(order_by)})"
+        self.client.execute(ddl)
+
+    def create_latest_view(self, view, table, key, columns, version):
+        """Create a view holding the newest version of each `key` row, across partitions."""
+        cols = ',\n    '.join(f"argMax({quote(c)}, {version}) AS {quote(c)}"
+                               for c in columns if c not in key)
+        self.client.execute(
+            f"CREATE VIEW IF NOT EXISTS {view} AS\nSELECT\n    {', '.join(key)},\n    {cols},\n"
+            f"    max({version}) AS {version}\nFROM {table}\nGROUP BY {', '.join(key)}"
+        )
+
+    def insert(self, table, columns, rows, dedup_token=None):
+        """Insert `rows` (tuples in `columns` order) as one columnar block."""
+        if not rows:
+            return
+        self.insert_columns(table, dict(zip(columns, zip(*rows))), dedup_token)
+
+    def insert_columns(self, table, data, dedup_token=None):
+        """Insert `data` ({column: values}, see column_values) as one columnar block."""
+        arrays = [column_values(values) for values in data.values()]
+        if not arrays or not arrays[0]:
+            return
+        settings = {'insert_deduplication_token': dedup_token} if dedup_token else None
+        self.client.execute(
+            f"INSERT INTO {table} ({', '.join(quote(c) for c in data)}) VALUES",
+            arrays, columnar=True, settings=settings
+        )
+
+    # Rows of a ReplacingMergeTree are replaced by inserting a newer version
+    upsert = insert
+
+    def insert_missing(self, table, columns, select, key):
+        """Insert the rows of the `select` query whose `key` columns are not in `table` yet."""
+        cols = ', '.join(quote(c) for c in columns)
+        keys = ', '.join(quote(c) for c in key)
+        self.client.execute(f"INSERT INTO {table} ({cols}) SELECT {cols} FROM ({select}) "
+                            f"WHERE ({keys}) NOT IN (SELECT {keys} FROM {table})")
+
+    def delete(self, table, matches, chunk_size=10000):
+        """
+        Delete the rows where any column of `matches` ({column: values}) holds one of its values.
+        Each chunk is one ALTER TABLE ... DELETE mutation that returns only once it has finished,
+        so rows inserted afterwards are never deleted by it.
+        """
+        for chunk in _match_chunks(matches, chunk_size):
+            where = ' OR '.join(f"{quote(c)} IN %(v{i})s" for i, c in enumerate(chunk))
+            self.client.execute(f"ALTER TABLE {table} DELETE WHERE {where}",
+                                {f"v{i}": tuple(v) for i, v in enumerate(chunk.values())},
+                                settings={'mutations_sync': 2})
+
+    def select(self, table, columns, where='', final=True, block_size=10000, as_dict=True):
+        """Stream `columns` of `table` (latest versions when `final`) over a dedicated connection."""
+        sql = f"SELECT {', '.join(quote(c) for c in columns)} FROM {table}"
+        if final:
+            sql += " FINAL"
+        if where:
+            sql += f" WHERE {where}"
+        return self.stream(sql, columns if as_dict else None, block_size)
+
+    def stream(self, sql, columns=None, block_size=10000):
+        """Stream an arbitrary SELECT over a dedicated connection."""
+        client = self._client_cls(**self.config)
+        try:
+            yield from stream_rows(client, sql, columns, block_size)
+        finally:
+            client.disconnect()
+
+    def count(self, table, where='', final=True):
+        sql = f"SELECT count() FROM {table}" + (" FINAL" if final else "")
+        if where:
+            sql += f" WHERE {where}"
+        return self.client.execute(sql)[0][0]
+
+    def execute(self, sql, params=None):
+        return self.client.execute(sql, params)
+
+    def close(self):
+        self.client.disconnect()
+
+
+_SQLITE_TYPES = {'String': "TEXT DEFAULT ''", 'DateTime': "TEXT DEFAULT CURRENT_TIMESTAMP",
+                 'DateTime64': "TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))",
+                 'Date': "TEXT DEFAULT CURRENT_DATE"}
+
+
+def _sqlite_type(ch_type):
+    base = ch_type.split()[0].split('(')[0]
+    if base in _SQLITE_TYPES:
+        return _SQLITE_TYPES[base]
+    if base.startswith(('Int', 'UInt')):
+        return 'INTEGER DEFAULT 0'
+    if base.startswith('Float'):
+        return 'REAL DEFAULT 0'
+    return 'TEXT'
+
+
+class SQLiteStorage:
+    """Embedded single-file stand-in for ClickHouse."""
+    dialect = 'sqlite'
+
+    def __init__(self, path='hra_rag_ftu.sqlite'):
+        self.path = path
+        self.conn = self._connect()
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=60)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def name(self, table):
+        """SQLite has no databases; 'db.table' maps to 'table'."""
+        return table.split('.')[-1]
+
+    def source(self, table, alias=None, final=False):
+        return self.name(table) + (f" AS {alias}" if alias else "")
+
+    def create_table(self, table, columns, order_by, version=None, partition_by=None):
+        table = self.name(table)
+        cols = [f"{quote(c)} {_sqlite_type(t)}" for c, t in columns.items()]
+        if version:
+            cols.append(f"PRIMARY KEY ({', '.join(quote(c) for c in order_by)})")
+        with self._lock:
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(cols)})")
+            if not version:
+                self.conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{table}_order "
+                    f"ON {table} ({', '.join(quote(c) for c in order_by)})"
+                )
+            self.conn.commit()
+
+    def create_latest_view(self, view, table, key, columns, version):
+        # Keyed tables only ever hold the latest version in SQLite
+        with self._lock:
+            self.conn.execute(
+                f"CREATE VIEW IF NOT EXISTS {self.name(view)} AS "
+                f"SELECT {', '.join(quote(c) for c in columns)}, {version} FROM {self.name(table)}"
+            )
+            self.conn.commit()
+
+    def insert(self, table, columns, rows, dedup_token=None):
+        """Insert `rows` in one transaction; rows with an existing primary key replace it."""
+        if not rows:
+            return
+        sql = (f"INSERT OR REPLACE INTO {self.name(table)} ({', '.join(quote(c) for c in columns)}) "
+               f"VALUES ({', '.join('?' for _ in columns)})")
+        with self._lock:
+            self.conn.executemany(sql, [tuple(_sqlite_value(v) for v in row) for row in rows])
+            self.conn.commit()
+
+    def insert_columns(self, table, data, dedup_token=None):
+        """Insert `data` ({column: values}, see column_values) in one transaction."""
+        self.insert(table, list(data), list(zip(*(column_values(values) for values in data.values()))))
+
+    upsert = insert
+
+    def insert_missing(self, table, columns, select, key):
+        """Insert the rows of the `select` query whose primary key (`key`) is not in `table` yet."""
+        cols = ', '.join(quote(c) for c in columns)
+        with self._lock:
+            self.conn.execute(f"INSERT OR IGNORE INTO {self.name(table)} ({cols}) "
+                              f"SELECT {cols} FROM ({select})")
+            self.conn.commit()
+
+    def delete(self, table, matches, chunk_size=500):
+        """Delete the rows where any column of `matches` ({column: values}) holds one of its values."""
+        with self._lock:
+            for chunk in _match_chunks(matches, chunk_size):
+                where = ' OR '.join(f"{quote(c)} IN ({', '.join('?' for _ in v)})" for c, v in chunk.items())
+                self.conn.execute(f"DELETE FROM {self.name(table)} WHERE {where}",
+                                  [v for values in chunk.values() for v in values])
+            self.conn.commit()
+
+    def select(self, table, columns, where='', final=True, block_size=10000, as_dict=True):
+        sql = f"SELECT {', '.join(quote(c) for c in columns)} FROM {self.name(table)}"
+        if where:
+            sql += f" WHERE {where}"
+        return self.stream(sql, columns if as_dict else None, block_size)
+
+    def stream(self, sql, columns=None, block_size=10000):
+        conn = self._connect()
+        try:
+            cur = conn.execute(sql)
+            while True:
+                block = cur.fetchmany(block_size)
+                if not block:
+                    break
+                for row in block:
+                    yield dict(zip(columns, row)) if columns else row
+        finally:
+            conn.close()
+
+    def count(self, table, where='', final=True):
+        sql = f"SELECT count(*) FROM {self.name(table)}"
+        if where:
+            sql += f" WHERE {where}"
+        with self._lock:
+            return self.conn.execute(sql).fetchone()[0]
+
+    def execute(self, sql, params=None):
+        with self._lock:
+            cur = self.conn.execute(sql, params or ())
+            rows = cur.fetchall()
+            self.conn.commit()
+        return rows
+
+    def close(self):
+        self.conn.close()
+
+
+def _match_chunks(matches, chunk_size):
+    """Split {column: values} into {column: up to `chunk_size` values} dicts, leaving out empty columns."""
+    matches = {column: list(values) for column, values in matches.items()}
+    for start in range(0, max(map(len, matches.values()), default=0), chunk_size):
+        yield {column: values[start:start + chunk_size]
+               for column, values in matches.items() if values[start:start + chunk_size]}
+
+
+def column_values(values):
+    """A column as a list of Python values: from a list or tuple, numpy array, pandas Series or Arrow array."""
+    if hasattr(values, 'to_pylist'):
+        return values.to_pylist()
+    if hasattr(values, 'tolist'):
+        return values.tolist()
+    return list(values)
+
+
+def insert_frame(store, table, df, columns=None, block_size=100000):
+    """
+    Insert the `columns` (default: all) of a pandas DataFrame column by column, in blocks of
+    `block_size` rows, without building a tuple per row.
+    """
+    columns = list(columns if columns is not None else df.columns)
+    for start in range(0, len(df), block_size):
+        block = df.iloc[start:start + block_size]
+        store.insert_columns(table, {col: block[col] for col in columns})
+
+
+def _sqlite_value(v):
+    if isinstance(v, (list, tuple, dict)):
+        return str(v)
+    if isinstance(v, datetime.datetime):
+        return v.strftime('%Y-%m-%d %H:%M:%S')
+    return v
@@ -0,0 +1,69 @@
+import json
+import sys
+
+from json_scan import JsonScanner, extract_json_objects, first_json_array, scan_json
+
+
+def test_objects_in_prose():
+    text = 'Answer: {"a": 1} and then {"b": [1, 2, {"c": 3}]} done'
+    assert extract_json_objects(text) == [{'a': 1}, {'b': [1, 2, {'c': 3}]}]
+
+
+def test_lenient_repairs():
+    assert extract_json_objects("{'a': True, 'b': None, 'c': [1, 2,],}") == [{'a': True, 'b': None, 'c': [1, 2]}]
+
+
+def test_first_json_array():
+    assert first_json_array('labels: ["Liver", "Kidney"] and [1]') == ['Liver', 'Kidney']
+    assert first_json_array('no array here') == []
+
+
+def test_braces_inside_strings():
+    assert extract_json_objects('{"a": "}{", "b": "\\"{"}') == [{'a': '}{', 'b': '"{'}]
+
+
+def test_invalid_container_keeps_valid_children():
+    assert extract_json_objects('{ bad { "x": 1 } text { "y": 2 } }') == [{'x': 1}, {'y': 2}]
+
+
+def test_mismatched_and_unclosed_containers():
+    assert extract_json_objects('{"a": {"b": 1} ] {"c": 2}') == [{'b': 1}, {'c': 2}]
+    assert extract_json_objects('{ unfinished {"d": 4} [ {"e": 5}') == [{'d': 4}, {'e': 5}]
+
+
+def test_streamed_chunks_match_whole_text():
+    text = 'x {"a": {"b": [1, 2]}} y { bad {"c": "\\u00e9"} } {"d": 4'
+    scanner = JsonScanner()
+    values = []
+    for i in range(0, len(text), 3):
+        values += scanner.feed(text[i:i + 3])
+    values += scanner.close()
+    assert values == scan_json(text)
+
+
+def test_deep_invalid_nesting():
+    depth = sys.getrecursionlimit() * 2
+    assert scan_json('{x' * depth + '}' * depth) == []
+    assert scan_json('{x' * depth + '{"ok": 1}' + '}' * depth) == [{'ok': 1}]
+
+
+def test_deep_invalid_nesting_with_valid_leaves():
+    depth = 500
+    text = '{"a": ' * depth + '{x} {"leaf": true}' + '}' * depth
+    assert scan_json(text) == [{'leaf': True}]
+
+
+def test_deep_valid_nesting_does_not_raise():
+    depth = sys.getrecursionlimit() * 3
+    values = scan_json('{"a": ' * depth + '1' + '}' * depth)
+    # Deeper than the decoder can build: the outermost decodable object is returned
+    assert len(values) == 1
+    assert json.dumps(values[0]).startswith('{"a": {"a": ')
+
+
+def test_valid_nesting_within_decoder_limit():
+    depth = 200
+    value = scan_json('{"a": ' * depth + '1' + '}' * depth)[0]
+    for _ in range(depth):
+        value = value['a']
+    assert value == 1
@@ -0,0 +1,95 @@
+"""
+Batched donor-attribute classification.
+Packs up to K values into one gemma2 request that answers with a keyed JSON object
+({"1": "<category>", "2": ...}), so the long instruction prompt is sent and encoded once per
+batch instead of once per value. Each item's answer is checked against the category list;
+items with a missing or invalid answer are re-queued into a later batch, and after
+`max_attempts` they default to 'others' like the single-value send_request.
+"""
+import json
+import os
+import random
+import sys
+from collections import deque
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lm-rag'))
+from json_scan import scan_json
+
+BATCH_TEMPLATE = """{instructions}
+
+### Batch mode:
+Classify each of the following {n} expressions on its own, applying the rules above:
+{items}
+
+### Output format:
+Respond with a single JSON object that maps every item number to exactly one category from the
+list (or "others"), for example: {example}
+"""
+
+
+def build_batch_prompt(instructions, values, categories):
+    items = '\n'.join(f"{i}. {' '.join(str(v).split())}" for i, v in enumerate(values, 1))
+    example = json.dumps({str(i): categories[0] for i in range(1, min(len(values), 2) + 1)},
+                         ensure_ascii=False)
+    return BATCH_TEMPLATE.format(instructions=instructions.strip(), n=len(values),
+                                 items=items, example=example)
+
+
+def parse_batch_answer(reply, n, categories):
+    """Map item number (1..n) to a canonical category for every valid answer in `reply`."""
+    canonical = {c.lower(): c for c in list(categories) + ['others']}
+    answers = {}
+    for obj in scan_json(reply, '{'):
+        for key, value in obj.items():
+            if isinstance(value, list):
+                value = value[0] if len(value) == 1 else None
+            try:
+                idx = int(str(key).strip().rstrip('.'))
+            except ValueError:
+                continue
+            if 1 <= idx <= n and isinstance(value, str) and value.strip().lower() in canonical:
+                answers[idx] = canonical[value.strip().lower()]
+        if answers:
+            break
+    return answers
+
+
+def send_batch(values, instructions, categories, ip_port_list, model='gemma2:27b'):
+    """One request for `values`; returns {value index: category} for the items answered validly."""
+    data = {
+        "model": model,
+        "messages": [{"role": "user", "content": build_batch_prompt(instructions, values, categories)}],
+        "format": "json",
+        "stream": False
+    }
+    ip_port = random.choice(ip_port_list)
+    try:
+        response = requests.post(f"http://{ip_port}/api/chat", json=data)
+        if response.status_code != 200:
+            print(f"Request to {ip_port} failed: HTTP {response.status_code}")
+            return {}
+        reply = response.json().get('message', {}).get('content', '')
+    except Exception as e:
+        print(f"Error contacting {ip_port}: {e}")
+        return {}
+    return {i - 1: cat for i, cat in parse_batch_answer(reply, len(values), categories).items()}
+
+
+def classify_batched(values, instructions, categories, ip_port_list, k=20, max_attempts=3,
+                     model='gemma2:27b'):
+    """Yield (value, [category]) for every value, sending them K at a time."""
+    queue = deque((v, 0) for v in values)
+    while queue:
+        batch = [queue.popleft() for _ in range(min(k, len(queue)))]
+        answers = send_batch([v for v, _ in batch], instructions, categories, ip_port_list, model)
+        for i, (value, attempts) in enumerate(batch):
+            if i in answers:
+                print(f"[{value}] -> {[answers[i]]}")
+                yield value, [answers[i]]
+            elif attempts + 1 < max_attempts:
+                queue.append((value, attempts + 1))
+            else:
+                print(f"Defaulting to 'others' for {value}")
+                yield value, ['others']
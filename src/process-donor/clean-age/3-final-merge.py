@@ -27,7 +27,7 @@ else:
     print("Fail to read age.csv")
     exit()
 
-merge_all_df = pd.read_excel('data\donor-meta\age\merge-all.xlsx')
+merge_all_df = merged_df
 
 age_df['tag'] = 'others'
 
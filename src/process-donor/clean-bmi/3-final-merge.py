@@ -27,7 +27,7 @@ else:
     print("Fail to read bmi.csv")
     exit()
 
-merge_all_df = pd.read_excel('data\donor-meta\bmi\merge-all.xlsx')
+merge_all_df = merged_df
 
 bmi_df['tag'] = 'others'
 
@@ -1,27 +1,8 @@
 #!/bin/bash
 
-# Loop 5 times
-for i in {1..5}; do
-    echo "=== Starting round $i ==="
+# All rounds run in memory until the answers agree (see consensus.py); the vote log in
+# data\donor-meta\bmi\consensus_state.jsonl lets an interrupted run resume.
+# The round scripts (0-, 1-, 2-, 3-*.py) still reproduce the file-based flow.
+python src\process-donor\run-consensus.py --attr bmi --max-rounds 5
 
-    python src\process-donor\clean-bmi\0-clean-bmi.py
-
-    python src\process-donor\clean-bmi\1-merged.py
-
-    ROUND_FILE="data\donor-meta\bmi\round.csv"
-    ROUND_NUM=$(head -n 1 "$ROUND_FILE" | awk -F',' '{print $1}')
-    echo "Current round: $ROUND_NUM"
-
-    if [ "$ROUND_NUM" -eq 1 ]; then
-        echo "Round is 1, updating to 2 and skipping analyse-same.py"
-        echo "2" > "$ROUND_FILE"
-    else
-        echo "Round is greater than 1, running analyse-same.py"
-        python src\process-donor\clean-bmi\2-analyse-same.py
-    fi
-
-    echo "=== Finished round $i ==="
-    echo
-Done
-
-echo "All 5 rounds completed."
+echo "Consensus run completed."
@@ -28,7 +28,7 @@ else:
     print("Fail to read sex.csv")
     exit()
 
-merge_all_df = pd.read_excel('data\donor-meta\sex\merge-all.xlsx')
+merge_all_df = merged_df
 
 sex_df['tag'] = 'others'
 
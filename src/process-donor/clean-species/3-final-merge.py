@@ -29,7 +29,7 @@ else:
     print("Fail to read species.csv")
     exit()
 
-merge_all_df = pd.read_excel('data\donor-meta\species\merge-all.xlsx')
+merge_all_df = merged_df
 
 species_df['tag'] = 'others'
 
@@ -0,0 +1,142 @@
+"""
+One round of the file-based donor cleaning flow, run by the clean-<attr>/0-clean-*.py scripts.
+The values of data/donor-meta/<attr>/<column>_<round>.csv (the round number is read from
+round.csv) are classified with the categories and prompt of the attribute's spec in
+donor_attributes and written to results_batch_<n>.xlsx workbooks in the <column>_<round>
+folder. Values the spec's rule can parse need no LLM call; the others are sent BATCH_K per
+request, or one per request through send_request when BATCH_K is 1.
+"""
+import itertools
+import os
+import random
+import sys
+
+import pandas as pd
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lm-rag'))
+from batch_classify import classify_batched
+from donor_attributes import ATTRIBUTES, ip_port_list
+from donor_rules import pre_classify
+from json_scan import first_json_array
+from progress_store import open_progress
+
+# Values classified per request (1: one request per value via send_request)
+BATCH_K = 20
+# Values per results_batch_<n>.xlsx
+BATCH_SIZE = 100
+
+SINGLE_TEMPLATE = """{instructions}
+
+### Expression:
+{value}
+
+### Output format:
+Respond with a JSON array holding exactly one category from the list (or "others"), for example: {example}
+"""
+
+
+def send_request(spec, value, model='gemma2:27b'):
+    """Classify one value with the spec's prompt; (value, [category]), or ['others'] after 3 failed attempts."""
+    content = SINGLE_TEMPLATE.format(instructions=spec.instructions.strip(), value=value,
+                                     example=f'["{spec.categories[0]}"]')
+    data = {
+        "model": model,
+        "messages": [{"role": "user", "content": content}],
+        "stream": False
+    }
+
+    for attempt in range(3):
+        ip_port = random.choice(ip_port_list)
+        url = f"http://{ip_port}/api/chat"
+        try:
+            response = requests.post(url, json=data)
+            if response.status_code == 200:
+                reply = response.json().get('message', {}).get('content', '')
+                categories = first_json_array(reply)
+                if categories:
+                    print(f"[{value}] -> {categories}")
+                    return value, categories
+                else:
+                    print(f"No JSON found for {value} (attempt {attempt+1}).")
+            else:
+                print(f"Request to {ip_port} failed: HTTP {response.status_code}")
+        except Exception as e:
+            print(f"Error contacting {ip_port}: {e}")
+    # If all attempts fail, classify as others
+    print(f"Defaulting to 'others' for {value}")
+    return value, ['others']
+
+
+def save_results(results, batch_num, output_dir, column):
+    """
+    Save a batch of results to an Excel file in the output directory.
+    """
+    df = pd.DataFrame(results, columns=[column, 'categories'])
+    os.makedirs(output_dir, exist_ok=True)
+    filename = os.path.join(output_dir, f"results_batch_{batch_num}.xlsx")
+    df.to_excel(filename, index=False)
+    print(f"Batch {batch_num} saved to {filename}")
+    return batch_num + 1
+
+
+def main(name, batch_k=BATCH_K, batch_size=BATCH_SIZE):
+    spec = ATTRIBUTES[name]
+    column = spec.column
+
+    # Determine round number
+    round_file = 'round.csv'
+    if not os.path.isfile(round_file):
+        print("round.csv not found. Exiting.")
+        return
+    try:
+        round_number = int(pd.read_csv(round_file, header=None).iloc[0, 0])
+    except Exception as e:
+        print(f"Error reading round.csv: {e}")
+        return
+
+    data_dir = os.path.join('data', 'donor-meta', spec.name)
+    input_csv = os.path.join(data_dir, f"{column}_{round_number}.csv")
+    output_dir = os.path.join(data_dir, f"{column}_{round_number}")
+
+    if not os.path.isfile(input_csv):
+        print(f"Input file {input_csv} not found.")
+        return
+
+    df = pd.read_csv(input_csv, encoding='latin1')
+    if column not in df.columns:
+        print(f"CSV must have a '{column}' column.")
+        return
+
+    processed = open_progress(output_dir, column)
+    all_values = df[column].astype(str).tolist()
+    to_process = [s for s in all_values if s not in processed]
+    print(f"Total: {len(all_values)}, Remaining: {len(to_process)}")
+    if not to_process:
+        print(f"No new {column} to process.")
+        return
+
+    # Continue the last batch file where an interrupted run left it
+    batch_num = processed.last_batch() or 1
+    results = processed.batch_rows(batch_num)
+    if len(results) >= batch_size:
+        batch_num, results = batch_num + 1, []
+
+    # Values the rules can parse need no LLM call
+    resolved, residue = pre_classify(to_process, spec.rule, spec.name) if spec.rule else ([], to_process)
+    if batch_k > 1:
+        classified = classify_batched(residue, spec.instructions, spec.categories, ip_port_list, k=batch_k)
+    else:
+        classified = (send_request(spec, value) for value in residue)
+    for result in itertools.chain(resolved, classified):
+        results.append(result)
+        if len(results) >= batch_size:
+            # A batch counts as done once its workbook is written
+            next_batch = save_results(results, batch_num, output_dir, column)
+            processed.add_many(results, batch_num)
+            batch_num = next_batch
+            results.clear()
+
+    if results:
+        save_results(results, batch_num, output_dir, column)
+        processed.add_many(results, batch_num)
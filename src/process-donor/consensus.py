@@ -0,0 +1,114 @@
+"""
+Multi-round consensus for donor-attribute classification.
+Replaces the per-round file shuffle (0-*.py writes results_batch_*.xlsx, 1-merged.py
+concatenates them, 2-analyse-same.py compares two rounds and writes the disagreements as the
+next round's CSV, round.csv holds the state). Every value is asked `agree` times concurrently;
+a value is settled as soon as one single-category answer has `agree` votes, and only the values
+still without agreement are asked again, up to `max_rounds` answers per value. Values that
+never reach agreement are tagged 'others', as in 3-final-merge.py.
+
+Each answer is appended to a JSON-lines log ([value, [category]] per line), so an interrupted
+run resumes with the votes it already collected instead of starting a new round from scratch.
+"""
+import json
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+
+class ConsensusEngine:
+    """
+    classify   -- callable taking a list of values and returning (value, [category]) pairs,
+                  e.g. classify_batched or map(send_request, ...)
+    state_path -- JSON-lines vote log used to resume
+    agree      -- matching answers needed to settle a value (2: two rounds agree, as before)
+    max_rounds -- answers collected for a value before it is given up as 'others'
+    batch_size -- values per classify call
+    workers    -- classify calls in flight
+    name       -- label for progress messages
+    """
+
+    def __init__(self, classify, state_path, agree=2, max_rounds=5, batch_size=20, workers=8, name='values'):
+        self.classify = classify
+        self.state_path = state_path
+        self.agree = agree
+        self.max_rounds = max_rounds
+        self.batch_size = batch_size
+        self.workers = workers
+        self.name = name
+        self.votes = {}
+        self._lock = threading.Lock()
+        self._log = None
+        self._load()
+
+    def _load(self):
+        if not os.path.isfile(self.state_path):
+            return
+        with open(self.state_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    value, categories = json.loads(line)
+                except (ValueError, TypeError):
+                    # A line cut short by an interrupted run
+                    continue
+                self.votes.setdefault(value, []).append(tuple(categories))
+        print(f"{self.name}: resumed {sum(map(len, self.votes.values()))} answers for {len(self.votes)} values")
+
+    def label(self, value):
+        """The agreed [category] for `value`, or None while there is no agreement."""
+        counts = Counter(a for a in self.votes.get(value, ()) if len(a) == 1)
+        if counts:
+            answer, n = counts.most_common(1)[0]
+            if n >= self.agree:
+                return list(answer)
+        return None
+
+    def _needed(self, value):
+        """Answers still to request for `value` in the next round."""
+        answers = self.votes.get(value, ())
+        if self.label(value) is not None or len(answers) >= self.max_rounds:
+            return 0
+        counts = Counter(a for a in answers if len(a) == 1)
+        best = counts.most_common(1)[0][1] if counts else 0
+        return min(self.agree - best, self.max_rounds - len(answers))
+
+    def _ask(self, values):
+        for value, categories in self.classify(values):
+            with self._lock:
+                self.votes.setdefault(value, []).append(tuple(categories))
+                self._log.write(json.dumps([value, list(categories)], ensure_ascii=False) + '\n')
+                self._log.flush()
+
+    def run(self, values, settled=None, pool=None):
+        """
+        Classify `values` to consensus and return {value: [category]}.
+        `settled` holds values already known (e.g. from donor_rules), which are not asked.
+        `pool` is an executor shared with other engines; by default the engine starts its own.
+        """
+        settled = dict(settled or {})
+        values = list(dict.fromkeys(values))
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        with open(self.state_path, 'a', encoding='utf-8') as self._log, \
+                (nullcontext(pool) if pool else ThreadPoolExecutor(self.workers)) as pool:
+            for round_number in range(1, self.max_rounds + 1):
+                asks = {v: n for v in values if v not in settled for n in [self._needed(v)] if n > 0}
+                if not asks:
+                    break
+                print(f"{self.name} round {round_number}: {sum(asks.values())} answers requested for {len(asks)} values")
+                # Copies of a value go to different batches so they are independent answers
+                batches = []
+                for copy in range(max(asks.values())):
+                    wave = [v for v, n in asks.items() if n > copy]
+                    batches += [wave[i:i + self.batch_size] for i in range(0, len(wave), self.batch_size)]
+                for future in [pool.submit(self._ask, batch) for batch in batches]:
+                    future.result()
+        self._log = None
+
+        results = {v: settled.get(v) or self.label(v) for v in values}
+        agreed = sum(1 for v in values if v not in settled and results[v] is not None)
+        asked = sum(len(self.votes.get(v, ())) for v in values)
+        print(f"{self.name}: {len(settled)} settled by rules, {agreed} by agreement, "
+              f"{sum(r is None for r in results.values())} without agreement; {asked} answers in total")
+        return results
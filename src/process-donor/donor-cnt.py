@@ -6,16 +6,9 @@ df = pd.read_csv(r"data\donor-meta\ftu-donor-cnt.csv", encoding='gbk')  # 按需
 # 筛选出 Homo sapiens
 df = df[df['species_tag'] == 'Homo sapiens']
 
-# ✅ 标准化 sex_tag
-def normalize_sex_tag(x):
-    if pd.isna(x):
-        return x
-    elif x.lower() in ['male', 'female']:
-        return x.lower()
-    else:
-        return 'others'
-
-df['sex_tag'] = df['sex_tag'].apply(normalize_sex_tag)
+# ✅ 标准化 sex_tag: male / female, 其余为 others, 空值保留
+sex = df['sex_tag'].str.lower()
+df['sex_tag'] = sex.where(sex.isin(['male', 'female']), 'others').where(df['sex_tag'].notna())
 
 # ✅ 分组统计 donor_record_count 的总和
 grouped = (
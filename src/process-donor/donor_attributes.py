@@ -0,0 +1,162 @@
+"""
+Donor attribute specifications shared by the cleaners and the consensus runner.
+Each attribute lists its categories, the value-independent prompt used for batched requests,
+the donor_rules fast path and the columns it is read from and written to; the 0-clean scripts
+(through clean_attribute.py) and run-consensus.py all take them from here, so a prompt or
+category change is made once.
+"""
+import json
+
+from donor_rules import classify_age_stage, classify_age_yearold, classify_bmi, classify_sex
+
+ip_port_list = [
+    "your_ip_port_list" # add more addresses as needed
+]
+
+
+class AttributeSpec:
+    """
+    name         -- attribute key, also its data/donor-meta/<name> folder
+    column       -- value column of the round CSVs and the label table
+    source       -- donor_meta_all_info column written by 5-1-donor-run.py
+    categories   -- allowed answers besides "others"
+    instructions -- value-independent prompt for batched requests
+    rule         -- donor_rules function settling parseable values, or None
+    tag          -- label column of the tagged donor table (ftu-donor-cnt.csv)
+    input_name   -- round-1 value CSV in the attribute folder
+    """
+
+    def __init__(self, name, column, source, categories, instructions, rule, tag, input_name):
+        self.name = name
+        self.column = column
+        self.source = source
+        self.categories = categories
+        self.instructions = instructions
+        self.rule = rule
+        self.tag = tag
+        self.input_name = input_name
+
+    def __repr__(self):
+        return f"AttributeSpec({self.name!r})"
+
+
+AGE_STAGE_CATEGORIES = ["prenatal", "postnatal", "unknown"]
+
+AGE_STAGE_INSTRUCTIONS = """
+### Task:
+Determine the age category for each given age expression, based on the following list of age categories:
+
+["prenatal", "postnatal", "unknown"]
+
+Use these general rules (regardless of age):
+
+1. **Prenatal** if the expression refers to any time measured from fertilization or during embryogenesis/fetal development, for example:
+- Contains “E” plus a number (e.g. “E10.5”), “embryo”, “embryonic”
+- Mentions hours/days post fertilization (“hpf”, “dpf”)
+- Uses terms like “fetus”, “fetal”, “gestational”, “cleavage”, “blastula”, “gastrula”
+2. **Postnatal** if it refers to any time measured from birth or hatching onward, for example:
+- Contains “P” plus a number (e.g. “P7”), “neonate”, “newborn”
+- Specifies “X days/weeks/months/years old”
+- Uses life‐stage terms anchored to post‐birth (e.g. “juvenile”, “adult”, “aged”)
+3. If an expression could apply to both (or you’re uncertain), classify it as "unknown".
+
+### Rules:
+1. Only select one age category from the provided list for each expression.
+2. If an expression does not fit into any of these age categories, answer "others".
+"""
+
+
+AGE_YEAROLD_CATEGORIES = [
+    "<1 year old", "[1 year old, 5 years old)", "[5 years old, 10 years old)", "[10 years old, 15 years old)",
+    "[15 years old, 20 years old)", "[20 years old, 25 years old)", "[25 years old, 30 years old)",
+    "[30 years old, 35 years old)", "[35 years old, 40 years old)", "[40 years old, 45 years old)",
+    "[45 years old, 50 years old)", "[50 years old, 55 years old)", "[55 years old, 60 years old)",
+    "[60 years old, 65 years old)", "[65 years old, 70 years old)", "[70 years old, 75 years old)",
+    "[75 years old, 80 years old)", "[80 years old, 85 years old)", "[85 years old, 90 years old)",
+    "[90 years old, 95 years old)", "[95 years old, 100 years old)", ">=100 years old"
+]
+
+AGE_YEAROLD_INSTRUCTIONS = f"""
+### Task:
+Determine the age category for each given age expression, based on the following list of age categories:
+
+{json.dumps(AGE_YEAROLD_CATEGORIES)}
+
+### Age Range Interpretation:
+- All age ranges use **left-closed, right-open intervals**: **[x years old, y years old)**
+- Meaning:
+- **Include** the left boundary (age ≥ x years)
+- **Exclude** the right boundary (age < y years)
+- Special cases:
+- `<1 year old` includes any age **less than 1 year** (e.g., infants, newborns, months).
+- `>=100 years old` includes any age of **100 years or more**.
+
+### Rules:
+1. Only select one age category from the provided list for each expression.
+2. If an expression does not fit into any of these age categories, answer "others".
+For example, "12 years old" is "[10 years old, 15 years old)".
+"""
+
+
+BMI_CATEGORIES = ["Underweight", "Normal weight", "Overweight", "Obesity"]
+
+BMI_INSTRUCTIONS = """
+You are a Body mass index(BMI) classification assistant. Using the following BMI categories:
+
+  • Underweight = BMI < 18.5
+  • Normal weight = BMI 18.5–24.9
+  • Overweight = BMI 25–29.9
+  • Obesity = BMI ≥ 30
+
+### Task:
+Determine the BMI category for each given BMI expression, based on the following list of BMI categories:
+
+["Underweight", "Normal weight", "Overweight", "Obesity"]
+
+### Rules:
+1. Only select one BMI category from the provided list for each expression.
+2. If an expression does not fit into any of these BMI categories, answer "others".
+For example, "17.8" is "Underweight" and "24.5" is "Normal weight".
+"""
+
+
+SEX_CATEGORIES = ["male", "female", "both male and female", "Hermaphrodite"]
+
+SEX_INSTRUCTIONS = """
+### Task:
+Determine the sex category for each given organism, based on the following list of sex categories:
+
+["male", "female", "both male and female", "Hermaphrodite"]
+
+### Rules:
+1. Only select one sex category from the provided list for each expression.
+2. If an expression does not fit into any of these sex categories, answer "others".
+"""
+
+
+SPECIES_CATEGORIES = [
+    "Homo sapiens", "Mus musculus", "Rattus norvegicus", "Sus scrofa", "Gadus morhua"
+]
+
+SPECIES_INSTRUCTIONS = f"""
+### Task:
+Determine which species category each given organism belongs to, based on the provided categories.
+
+Categories: {SPECIES_CATEGORIES}
+
+Rules:
+1. Select exactly one category from the list for each organism.
+2. If no category matches, answer "others".
+"""
+
+
+ATTRIBUTES = {spec.name: spec for spec in [
+    AttributeSpec('species', 'species', 'species', SPECIES_CATEGORIES, SPECIES_INSTRUCTIONS, None,
+                  'species_tag', 'species_1.csv'),
+    AttributeSpec('sex', 'sex', 'sex', SEX_CATEGORIES, SEX_INSTRUCTIONS, classify_sex, 'sex_tag', 'sex_1.csv'),
+    AttributeSpec('age', 'age', 'age', AGE_STAGE_CATEGORIES, AGE_STAGE_INSTRUCTIONS, classify_age_stage,
+                  'age_tag', 'age_1.csv'),
+    AttributeSpec('age_yearold', 'age', 'age', AGE_YEAROLD_CATEGORIES, AGE_YEAROLD_INSTRUCTIONS,
+                  classify_age_yearold, 'age_yearold_tag', 'age_1.csv'),
+    AttributeSpec('bmi', 'bmi', 'BMI', BMI_CATEGORIES, BMI_INSTRUCTIONS, classify_bmi, 'bmi_tag', 'bmi_1.csv'),
+]}
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Materialized donor aggregation cube.
+Built once from the tagged donor table (label-join.py --tagged), the cleaned scale bars and the
+health/disease figure lists, then stored as Parquet, so count tables and figure sources
+(ftu-donor-cnt, homo_sapiens_summary_cnt, the sf-5 heatmaps, the 7a/7b and sf-7/sf-8 scale-bar
+variants) become slices of the cube instead of new passes over the raw CSVs.
+
+cells.parquet      -- one row per (ftu, organ, species/sex/age/age_yearold/bmi tag, health)
+                      cell, with its donor_records
+pmcids.parquet     -- the distinct (cell, pmcid) pairs, so distinct article counts stay exact
+scale_bars.parquet -- one row per scale bar with a known unit: bar id and value_um
+bar_cells.parquet  -- the distinct (cell, bar) pairs
+
+A scale bar takes the donor tags of its article and FTU, so it belongs to one cell per distinct
+tag combination. Its value is stored once, keyed by bar id, and a slice counts the distinct
+bars of each group: a bar is counted once however many tag combinations of a group it falls
+in, so sb_count summed over a slice by ftu/organ/health is the number of scale bars. health is
+the status of the figure for scale bars and of the article for donor records ('health' or
+'disease' when only one list has it).
+    python src/process-donor/donor_cube.py --donors data/donor-meta/ftu-donor-tags.parquet
+
+    cube = DonorCube.load('data/donor-meta/cube')
+    cube.slice(['ftu', 'sex_tag'], where={'species_tag': 'Homo sapiens', 'health': 'health'})
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+TAGS = ['species_tag', 'sex_tag', 'age_tag', 'age_yearold_tag', 'bmi_tag']
+DIMENSIONS = ['ftu', 'organ'] + TAGS + ['health']
+UM_PER_UNIT = {'um': 1.0, 'nm': 1e-3, 'angstrom': 1e-4, 'mm': 1e3, 'cm': 1e4, 'm': 1e6}
+
+
+def scale_bar_um(sb):
+    """Scale bars with a known unit, with their length in um."""
+    factor = sb['standard_unit'].str.strip().str.lower().map(UM_PER_UNIT)
+    value = pd.to_numeric(sb['value_new'], errors='coerce') * factor
+    return sb.assign(value_um=value)[value.notna()]
+
+
+def _status(keys, health, disease):
+    in_health, in_disease = keys.isin(health), keys.isin(disease)
+    return np.select([in_health & ~in_disease, in_disease & ~in_health], ['health', 'disease'], 'unspecified')
+
+
+TABLES = ('cells', 'pmcids', 'scale_bars', 'bar_cells')
+
+
+class DonorCube:
+    def __init__(self, cells, pmcids, scale_bars, bar_cells):
+        self.cells = cells
+        self.pmcids = pmcids
+        self.scale_bars = scale_bars
+        self.bar_cells = bar_cells
+
+    @classmethod
+    def build(cls, donors, scale_bars, organs, health, disease):
+        """
+        donors     -- tagged donor records: ftu, pmcid and the *_tag columns
+        scale_bars -- ftu, pmcid, graphic, value_new, standard_unit (sb-cleaned2.csv.gz)
+        organs     -- organ, ftu (organ-ftu-uberon.csv)
+        health, disease -- figure lists with pmcid, graphic (sb-health.csv, sb-disease.csv)
+        """
+        tags = donors[['ftu', 'pmcid']].assign(**{t: donors.get(t, '') for t in TAGS})
+        tags[TAGS] = tags[TAGS].astype(object).fillna('').astype(str)
+        organ_of = organs.drop_duplicates('ftu').set_index('ftu')['organ']
+
+        # Donor records, with the article-level health status
+        donor_facts = tags.assign(
+            organ=tags['ftu'].map(organ_of),
+            health=_status(tags['pmcid'], set(health['pmcid']), set(disease['pmcid'])))
+
+        # Scale bars, with the donor tags of their article and FTU and the figure-level status
+        sb = scale_bar_um(scale_bars).reset_index(drop=True)
+        sb['bar'] = np.arange(len(sb))
+        figure = sb['pmcid'] + '/' + sb['graphic']
+        sb = sb.assign(health=_status(figure, set(health['pmcid'] + '/' + health['graphic']),
+                                      set(disease['pmcid'] + '/' + disease['graphic'])))
+        bars = sb[['bar', 'value_um']]
+        sb = sb[['bar', 'ftu', 'pmcid', 'health']].merge(
+            tags.drop_duplicates(), on=['ftu', 'pmcid'], how='left')
+        sb[TAGS] = sb[TAGS].fillna('')
+        sb['organ'] = sb['ftu'].map(organ_of)
+
+        facts = pd.concat([donor_facts.assign(donor_records=1, bar=-1),
+                           sb.assign(donor_records=0)], ignore_index=True)
+        facts[DIMENSIONS] = facts[DIMENSIONS].fillna('')
+        facts['cell'] = facts.groupby(DIMENSIONS, sort=True).ngroup()
+
+        cells = (facts.groupby(['cell'] + DIMENSIONS, sort=False)
+                 .agg(donor_records=('donor_records', 'sum'))
+                 .reset_index())
+        cells[DIMENSIONS] = cells[DIMENSIONS].astype('category')
+        pmcids = facts[['cell', 'pmcid']].drop_duplicates().astype({'pmcid': 'category'})
+        bar_cells = facts.loc[facts['bar'] >= 0, ['cell', 'bar']].drop_duplicates()
+        return cls(cells, pmcids.reset_index(drop=True), bars, bar_cells.reset_index(drop=True))
+
+    @classmethod
+    def load(cls, cube_dir):
+        return cls(*(pd.read_parquet(os.path.join(cube_dir, f'{name}.parquet')) for name in TABLES))
+
+    def save(self, cube_dir):
+        os.makedirs(cube_dir, exist_ok=True)
+        for name in TABLES:
+            getattr(self, name).to_parquet(os.path.join(cube_dir, f'{name}.parquet'), index=False)
+
+    def check(self):
+        """Every scale bar must be counted exactly once in a slice by the bar-level dimensions."""
+        counted = self.slice(['ftu', 'organ', 'health'])['sb_count'].sum()
+        if counted != len(self.scale_bars):
+            raise ValueError(f"sb_count sums to {counted} over ftu/organ/health, "
+                             f"expected {len(self.scale_bars)} scale bars")
+
+    def slice(self, by, where=None):
+        """
+        Aggregate the cells matching `where` ({dimension: value or list of values}) by the
+        dimensions in `by`: donor_records, pmcid_count and scale-bar count/mean/std/min/median/max.
+        """
+        cells = self.cells
+        for dim, wanted in (where or {}).items():
+            wanted = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+            cells = cells[cells[dim].isin(wanted)]
+        group = (cells.groupby(list(by), observed=True, sort=True).ngroup() if by
+                 else pd.Series(0, index=cells.index))
+        cells = cells.assign(group=group.to_numpy())
+        group_of = cells.set_index('cell')['group']
+
+        out = cells.groupby('group').agg(donor_records=('donor_records', 'sum'))
+        pmcids = self.pmcids[self.pmcids['cell'].isin(group_of.index)]
+        out['pmcid_count'] = pmcids.assign(group=pmcids['cell'].map(group_of)).groupby('group')['pmcid'].nunique()
+        out = out.join(self._bar_stats(group_of))
+        out['sb_count'] = out['sb_count'].fillna(0).astype(int)
+
+        keys = cells.drop_duplicates('group').set_index('group')[list(by)].sort_index()
+        columns = ['donor_records', 'pmcid_count', 'sb_count', 'sb_mean', 'sb_std', 'sb_min', 'sb_median', 'sb_max']
+        result = keys.join(out[columns]).reset_index(drop=True)
+        result['pmcid_count'] = result['pmcid_count'].fillna(0).astype(int)
+        return result
+
+    def _bar_stats(self, group_of):
+        """Count, mean, std, min, lower median and max of the distinct scale bars per group."""
+        links = self.bar_cells[self.bar_cells['cell'].isin(group_of.index)]
+        bars = (links.assign(group=links['cell'].map(group_of).to_numpy())[['group', 'bar']]
+                .drop_duplicates()
+                .merge(self.scale_bars, on='bar'))
+        values = bars.groupby('group')['value_um']
+        return pd.DataFrame({
+            'sb_count': values.size(), 'sb_mean': values.mean(), 'sb_std': values.std(ddof=0),
+            'sb_min': values.min(), 'sb_median': values.quantile(0.5, interpolation='lower'),
+            'sb_max': values.max()})
+
+
+def main(args):
+    read = pd.read_parquet if args.donors.endswith('.parquet') else pd.read_csv
+    donors = read(args.donors)
+    scale_bars = pd.read_csv(args.scale_bars, dtype=str)
+    organs = pd.read_csv(args.organs)
+    figure_lists = []
+    for path in (args.health, args.disease):
+        if os.path.isfile(path):
+            figure_lists.append(pd.read_csv(path, encoding='utf-8-sig', dtype=str))
+        else:
+            print(f"{path} not found; no figures get that status")
+            figure_lists.append(pd.DataFrame(columns=['pmcid', 'graphic'], dtype=str))
+
+    cube = DonorCube.build(donors, scale_bars, organs, *figure_lists)
+    cube.check()
+    cube.save(args.output)
+    print(f"Saved {len(cube.cells)} cells, {len(cube.pmcids)} cell/article pairs, "
+          f"{len(cube.scale_bars)} scale bars and {len(cube.bar_cells)} cell/bar pairs to {args.output}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the donor aggregation cube')
+    parser.add_argument('--donors', default=os.path.join('data', 'donor-meta', 'ftu-donor-tags.parquet'),
+                        help='Tagged donor table written by label-join.py --tagged')
+    parser.add_argument('--scale-bars', default=os.path.join('data', 'scale-bar', 'sb-cleaned2.csv.gz'))
+    parser.add_argument('--organs', default=os.path.join('data', 'input-data', 'organ-ftu-uberon.csv'))
+    parser.add_argument('--health', default=os.path.join('data', 'scale-bar', 'sb-health.csv'))
+    parser.add_argument('--disease', default=os.path.join('data', 'scale-bar', 'sb-disease.csv'))
+    parser.add_argument('--output', default=os.path.join('data', 'donor-meta', 'cube'))
+    main(parser.parse_args())
@@ -0,0 +1,202 @@
+"""
+Deterministic pre-classifier for donor attribute values.
+Plain numerals and simple expressions (BMI values and thresholds, "N years old", "8 weeks",
+E14.5 / P7 stage notation, sex synonyms) are mapped to the target categories with the same
+rules the prompts spell out. Each rule returns a category or None; None values are left for
+the LLM. Missing-value markers ("unknown", "NA", "") map to 'others', as the prompts require.
+"""
+import math
+import re
+
+_NUM = r'(\d+(?:\.\d+)?)'
+_RANGE = re.compile(rf'^{_NUM}\s*(?:-|–|to|~)\s*{_NUM}$')
+_PARENTHETICAL = re.compile(r'\s*\([^)]*\)')
+_MISSING = {'', 'unknown', 'nan', 'none', 'na', 'n/a', 'n.a.', 'not reported', 'not specified',
+            'not mentioned', 'not available', 'not applicable', 'unspecified', 'not stated'}
+
+# ----- BMI -----
+_BMI_UNIT = r'(?:\s*kg\s*/\s*m\s*(?:2|²|\^2))?'
+_BMI = re.compile(rf'^(?:bmi\s*(?:=|:|of)?\s*)?{_NUM}{_BMI_UNIT}$')
+_BMI_ABOVE = re.compile(rf'^(?:bmi\s*)?(?:>=?|≥|over|above|greater than|more than)\s*{_NUM}{_BMI_UNIT}$'
+                        rf'|^{_NUM}{_BMI_UNIT}\s*(?:or|and) (?:greater|higher|above|more)$')
+_BMI_BELOW = re.compile(rf'^(?:bmi\s*)?(?:<=?|≤|under|below|less than)\s*{_NUM}{_BMI_UNIT}$')
+_BMI_WORDS = {
+    'underweight': 'Underweight',
+    'normal': 'Normal weight', 'normal weight': 'Normal weight', 'healthy weight': 'Normal weight',
+    'normal-weight': 'Normal weight', 'normal bmi': 'Normal weight',
+    'overweight': 'Overweight', 'over-weight': 'Overweight',
+    'obese': 'Obesity', 'obesity': 'Obesity', 'morbidly obese': 'Obesity', 'severe obesity': 'Obesity',
+}
+
+
+def _bmi_category(x):
+    if x < 18.5:
+        return 'Underweight'
+    if x < 25:
+        return 'Normal weight'
+    if x < 30:
+        return 'Overweight'
+    return 'Obesity'
+
+
+def classify_bmi(value):
+    """'24.5', 'BMI 31', '22.1 kg/m2', '19-23', '>= 30', 'obese' -> BMI category; None if not a plain BMI value."""
+    text = _normalize(value)
+    if text in _MISSING:
+        return 'others'
+    if text in _BMI_WORDS:
+        return _BMI_WORDS[text]
+    m = _BMI.match(text)
+    if m:
+        x = float(m.group(1))
+        return _bmi_category(x) if 10 <= x <= 80 else None
+    # Thresholds count only when the whole open interval falls in one category
+    m = _BMI_ABOVE.match(text)
+    if m:
+        x = float(next(g for g in m.groups() if g))
+        return 'Obesity' if x >= 30 else None
+    m = _BMI_BELOW.match(text)
+    if m:
+        return 'Underweight' if float(m.group(1)) <= 18.5 else None
+    m = _RANGE.match(re.sub(r'\s*kg\s*/\s*m\s*(?:2|²|\^2)$', '', text))
+    if m:
+        lo, hi = float(m.group(1)), float(m.group(2))
+        if 10 <= lo <= hi <= 80 and _bmi_category(lo) == _bmi_category(hi):
+            return _bmi_category(lo)
+    return None
+
+
+# ----- Age in years -----
+_UNIT_YEARS = {
+    'year': 1.0, 'yr': 1.0, 'y': 1.0,
+    'month': 1 / 12, 'mo': 1 / 12,
+    'week': 7 / 365.25, 'wk': 7 / 365.25, 'w': 7 / 365.25,
+    'day': 1 / 365.25, 'd': 1 / 365.25,
+}
+_UNIT = r'(years?|yrs?|y|months?|mos?|weeks?|wks?|w|days?|d)'
+_AGE = re.compile(rf'^(?:aged?\s+)?{_NUM}\s*-?\s*{_UNIT}\.?(?:\s*-?\s*old)?$')
+_AGE_RANGE = re.compile(rf'^(?:aged?\s+)?{_NUM}\s*(?:-|–|to|~)\s*{_NUM}\s*-?\s*{_UNIT}\.?(?:\s*-?\s*old)?$')
+_POSTNATAL_DAY = re.compile(rf'^(?:p|pnd|postnatal\s+day)\s*{_NUM}$')
+_UNDER_ONE_YEAR = {'infant', 'infants', 'infancy', 'infantile', 'newborn', 'newborns', 'neonate',
+                   'neonates', 'neonatal', 'pup', 'pups', 'suckling', 'birth', 'at birth'}
+
+
+def _years(n, unit):
+    return float(n) * _UNIT_YEARS[unit.rstrip('s')]
+
+
+def _year_bin(years):
+    if years < 1:
+        return '<1 year old'
+    if years >= 100:
+        return '>=100 years old'
+    if years < 5:
+        return '[1 year old, 5 years old)'
+    lo = int(math.floor(years / 5) * 5)
+    return f'[{lo} years old, {lo + 5} years old)'
+
+
+def classify_age_yearold(value):
+    """'35 years old', '8 weeks', '20-24 y', 'P7' -> 5-year age bin; None if not a plain age."""
+    text = _normalize(value)
+    if text in _MISSING:
+        return 'others'
+    if text in _UNDER_ONE_YEAR:
+        return '<1 year old'
+    m = _AGE.match(text)
+    if m:
+        return _year_bin(_years(m.group(1), m.group(2)))
+    m = _AGE_RANGE.match(text)
+    if m:
+        lo, hi = _years(m.group(1), m.group(3)), _years(m.group(2), m.group(3))
+        if lo <= hi and _year_bin(lo) == _year_bin(hi):
+            return _year_bin(lo)
+        return None
+    if _POSTNATAL_DAY.match(text):
+        return '<1 year old'
+    return None
+
+
+# ----- Prenatal / postnatal stage -----
+_PRENATAL = re.compile(
+    rf'^e\s*{_NUM}(?:\s*(?:-|–|to|until)\s*e?\s*{_NUM})?$'
+    rf'|^(?:embryonic\s+day|gestational\s+day|gd)\s*{_NUM}$|\b\d+(?:\.\d+)?\s*(?:hpf|dpf)\b'
+    r'|\b(?:embryos?|embryonic|fetus|fetal|foetal|gestation(?:al)?|blastula|gastrula|cleavage)\b'
+)
+_POSTNATAL = re.compile(
+    rf'^(?:p|pnd|postnatal\s+day)\s*{_NUM}$|\b(?:neonat\w*|newborns?|juveniles?|adults?|aged|elderly'
+    r'|infan\w*|p(?:a)?ediatric|child(?:ren)?|pups?|postnatal)\b'
+    r'|\b\d+(?:\.\d+)?\s*-?\s*(?:years?|months?|weeks?|days?)\s*-?\s*old\b'
+)
+
+
+def classify_age_stage(value):
+    """'E14.5', '48 hpf', 'fetal' -> prenatal; 'P7', '3 days old', 'adult' -> postnatal; None otherwise."""
+    text = _normalize(value)
+    prenatal = bool(_PRENATAL.search(text))
+    postnatal = bool(_POSTNATAL.search(text) or _AGE.match(text) or _AGE_RANGE.match(text))
+    if prenatal != postnatal:
+        return 'prenatal' if prenatal else 'postnatal'
+    return None
+
+
+# ----- Sex -----
+_SEX = {
+    'male': 'male', 'males': 'male', 'm': 'male', 'man': 'male', 'men': 'male',
+    'boy': 'male', 'boys': 'male', '♂': 'male',
+    'female': 'female', 'females': 'female', 'f': 'female', 'woman': 'female', 'women': 'female',
+    'girl': 'female', 'girls': 'female', '♀': 'female',
+    'hermaphrodite': 'Hermaphrodite', 'hermaphrodites': 'Hermaphrodite', 'hermaphroditic': 'Hermaphrodite',
+    'both': 'both male and female', 'both sexes': 'both male and female', 'either sex': 'both male and female',
+    'mixed': 'both male and female', 'mixed sex': 'both male and female', 'mixed sexes': 'both male and female',
+    'm/f': 'both male and female', 'f/m': 'both male and female',
+}
+# A male and a female word joined only by connectors: 'males and females', 'male/female', ...
+_SEX_CONNECTORS = {'and', 'or', '&', '/', 'both', 'combined', 'mixed', 'either'}
+_SEX_TOKEN = re.compile(r'[a-z]+|[&/]')
+
+
+def classify_sex(value):
+    """Sex synonyms ('M', 'women', 'males and females', ...) -> sex category; None otherwise."""
+    text = _normalize(value)
+    if text in _MISSING:
+        return 'others'
+    if text in _SEX:
+        return _SEX[text]
+    sexes, others = set(), []
+    for token in _SEX_TOKEN.findall(text):
+        if _SEX.get(token) in ('male', 'female'):
+            sexes.add(_SEX[token])
+        elif token not in _SEX_CONNECTORS:
+            others.append(token)
+    if sexes == {'male', 'female'} and not others:
+        return 'both male and female'
+    return None
+
+
+def _normalize(value):
+    """Lower-case, drop parenthetical notes, and undo UTF-8 text that was read as latin1."""
+    text = str(value)
+    try:
+        text = text.encode('latin1').decode('utf-8')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        pass
+    return ' '.join(_PARENTHETICAL.sub('', text).strip().lower().split())
+
+
+def pre_classify(values, rule, name='values'):
+    """
+    Split `values` into rule-classified results [(value, [category])] and the residue for the LLM,
+    and print the coverage.
+    """
+    resolved, residue = [], []
+    for value in values:
+        category = rule(value)
+        if category is None:
+            residue.append(value)
+        else:
+            resolved.append((value, [category]))
+    total = len(resolved) + len(residue)
+    share = 100 * len(resolved) / total if total else 0.0
+    print(f"Rules classified {len(resolved)}/{total} {name} ({share:.1f}%); {len(residue)} left for the LLM")
+    return resolved, residue
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Join the consensus labels of all donor attributes onto the donor table in one pass and emit
+the ftu-donor-cnt aggregation.
+Each label table (data/donor-meta/<attr>/<attr>_with_tags.csv, from run-consensus.py or
+3-final-merge.py) is read once into a categorical value -> tag lookup. Every raw donor column is
+factorized once, only its distinct values are looked up, and the codes are expanded back to the
+rows, so the join is a few array takes and attributes sharing a column (age, age_yearold) share
+the hashing. With pyarrow installed the CSVs are parsed by the Arrow reader.
+
+The donor table has one row per donor record: ftu, pmcid and the raw species/sex/age/BMI
+columns of donor_meta_all_info.
+    python src/process-donor/label-join.py --donors data/donor-meta/ftu-donor.csv
+    python src/process-donor/label-join.py --donors data/donor-meta/ftu-donor.csv --bench 3
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from donor_attributes import ATTRIBUTES
+
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    CSV_ENGINE = 'c'
+
+# Column order of ftu-donor-cnt.csv
+COUNT_ATTRIBUTES = ['species', 'age', 'sex', 'bmi', 'age_yearold']
+
+
+def read_csv(path, **kwargs):
+    return pd.read_csv(path, engine=CSV_ENGINE, dtype=str, keep_default_na=False, **kwargs)
+
+
+def tag_text(tags):
+    """"['Homo sapiens']" -> 'Homo sapiens'; plain tags such as 'others' are kept."""
+    return tags.str.replace(r"^\[\s*'(.*)'\s*\]$", r'\1', regex=True)
+
+
+def load_labels(spec, data_dir):
+    """Categorical Series of tags indexed by the raw value."""
+    path = os.path.join(data_dir, spec.name, f'{spec.name}_with_tags.csv')
+    df = read_csv(path)
+    df = df.drop_duplicates(spec.column)
+    return pd.Series(tag_text(df['tag']).to_numpy(), index=df[spec.column], name=spec.tag).astype('category')
+
+
+def join_labels(donors, labels):
+    """Add a categorical <attr>_tag column per label table; values without a label stay empty."""
+    by_source = {}
+    for name in labels:
+        by_source.setdefault(ATTRIBUTES[name].source, []).append(name)
+    for source, names in by_source.items():
+        codes, uniques = pd.factorize(donors[source].astype(str))
+        for name in names:
+            lookup = labels[name].reindex(uniques)
+            tag_codes = np.append(lookup.cat.codes.to_numpy(), -1)
+            # codes of -1 (missing donor value) index the trailing -1, i.e. no tag
+            donors[ATTRIBUTES[name].tag] = pd.Categorical.from_codes(tag_codes[codes],
+                                                                     lookup.cat.categories)
+    return donors
+
+
+def count_ftu_donors(donors):
+    """ftu-donor-cnt.csv: donor records per FTU and tag combination."""
+    tags = [ATTRIBUTES[name].tag for name in COUNT_ATTRIBUTES if ATTRIBUTES[name].tag in donors]
+    counts = (donors.groupby(['ftu'] + tags, dropna=False, observed=True)
+              .size().reset_index(name='donor_record_count'))
+    return counts.sort_values('donor_record_count', ascending=False, kind='stable')
+
+
+def legacy_join(donors, data_dir):
+    """The previous path: per attribute, a dict built from the label table and a row-wise map."""
+    donors = donors.copy()
+    for name in COUNT_ATTRIBUTES:
+        spec = ATTRIBUTES[name]
+        df = pd.read_csv(os.path.join(data_dir, name, f'{name}_with_tags.csv'))
+        value_to_tag = dict(zip(df[spec.column].astype(str), df['tag']))
+        donors[spec.tag] = donors[spec.source].astype(str).map(value_to_tag)
+    return donors.groupby(['ftu'] + [ATTRIBUTES[n].tag for n in COUNT_ATTRIBUTES], dropna=False).size()
+
+
+def bench(donors, data_dir, repeat):
+    def best(fn):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    t_old = best(lambda: legacy_join(donors, data_dir))
+    t_new = best(lambda: count_ftu_donors(join_labels(
+        donors.copy(), {n: load_labels(ATTRIBUTES[n], data_dir) for n in COUNT_ATTRIBUTES})))
+    print(f"{len(donors)} donor rows: dict map {t_old:.3f}s, factorized join {t_new:.3f}s "
+          f"({t_old / t_new:.1f}x, CSV engine {CSV_ENGINE})")
+
+
+def main(args):
+    donors = read_csv(args.donors)
+    print(f"Loaded {len(donors)} donor rows from {args.donors}")
+    if args.bench:
+        bench(donors, args.data_dir, args.bench)
+        return
+
+    labels = {}
+    for name in COUNT_ATTRIBUTES:
+        try:
+            labels[name] = load_labels(ATTRIBUTES[name], args.data_dir)
+        except FileNotFoundError as e:
+            print(f"Skipping {name}: {e}")
+    donors = join_labels(donors, labels)
+
+    counts = count_ftu_donors(donors)
+    counts.to_csv(args.output, index=False)
+    print(f"Saved {len(counts)} rows to {args.output}")
+    if args.tagged:
+        if args.tagged.endswith('.parquet'):
+            donors.to_parquet(args.tagged, index=False)
+        else:
+            donors.to_csv(args.tagged, index=False)
+        print(f"Saved tagged donor table to {args.tagged}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Join donor attribute labels and count donor records per FTU')
+    parser.add_argument('--donors', default=os.path.join('data', 'donor-meta', 'ftu-donor.csv'),
+                        help='Donor records with ftu, pmcid and the raw attribute columns')
+    parser.add_argument('--data-dir', default=os.path.join('data', 'donor-meta'))
+    parser.add_argument('--output', default=os.path.join('data', 'donor-meta', 'ftu-donor-cnt.csv'))
+    parser.add_argument('--tagged', help='Also write the tagged donor table (.parquet or .csv)')
+    parser.add_argument('--bench', type=int, default=0, metavar='REPEAT',
+                        help='Time the previous dict-map join against this one instead of writing')
+    main(parser.parse_args())
@@ -0,0 +1,86 @@
+"""
+Progress store for the donor cleaners.
+Every classified value is recorded in SQLite (value as primary key, its categories and the
+batch it belongs to) once the results_batch_*.xlsx holding it has been written, so "already
+done?" is an index lookup and a restart no longer re-reads every workbook. Values answered
+after the last written batch are classified again. An output folder that only has Excel
+batches from earlier runs is imported once, the first time it is opened.
+"""
+import ast
+import json
+import os
+import re
+import sqlite3
+
+import pandas as pd
+
+_BATCH_FILE = re.compile(r'^results_batch_(\d+)\.xlsx$')
+
+
+class ProgressStore:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS progress ('
+                          'value TEXT PRIMARY KEY, categories TEXT NOT NULL, batch INTEGER NOT NULL)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS progress_batch ON progress (batch)')
+        self.conn.commit()
+
+    def __contains__(self, value):
+        return self.conn.execute('SELECT 1 FROM progress WHERE value = ?', (value,)).fetchone() is not None
+
+    def __len__(self):
+        return self.conn.execute('SELECT count(*) FROM progress').fetchone()[0]
+
+    def add(self, value, categories, batch):
+        self.add_many([(value, categories)], batch)
+
+    def add_many(self, results, batch):
+        self.conn.executemany('INSERT OR REPLACE INTO progress VALUES (?, ?, ?)',
+                              [(str(v), json.dumps(list(c), ensure_ascii=False), batch) for v, c in results])
+        self.conn.commit()
+
+    def last_batch(self):
+        return self.conn.execute('SELECT max(batch) FROM progress').fetchone()[0]
+
+    def batch_rows(self, batch):
+        """(value, categories) pairs of one batch, in the order they were recorded."""
+        rows = self.conn.execute('SELECT value, categories FROM progress WHERE batch = ? ORDER BY rowid', (batch,))
+        return [(v, json.loads(c)) for v, c in rows]
+
+    def import_batches(self, output_dir, column):
+        """Record the values of existing results_batch_*.xlsx files (one-time migration)."""
+        for fname in sorted(os.listdir(output_dir)):
+            m = _BATCH_FILE.match(fname)
+            if not m:
+                continue
+            path = os.path.join(output_dir, fname)
+            try:
+                df = pd.read_excel(path)
+            except Exception as e:
+                print(f"Failed to read {path}: {e}")
+                continue
+            self.add_many(zip(df[column].astype(str), df['categories'].map(_parse_categories)), int(m.group(1)))
+
+    def close(self):
+        self.conn.close()
+
+
+def _parse_categories(cell):
+    try:
+        value = ast.literal_eval(str(cell))
+    except (ValueError, SyntaxError):
+        return [str(cell)]
+    return value if isinstance(value, list) else [str(value)]
+
+
+def open_progress(output_dir, column):
+    """The progress store of an output folder, importing its Excel batches on first use."""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, 'progress.sqlite')
+    is_new = not os.path.isfile(path)
+    store = ProgressStore(path)
+    if is_new:
+        store.import_batches(output_dir, column)
+    return store
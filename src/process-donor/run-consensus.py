@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Classify donor attributes to consensus in one concurrent pass.
+The attribute specs (categories, prompt, rule-based fast path, columns) come from
+donor_attributes. All selected attributes run at the same time and share one pool of LLM
+requests. Each attribute keeps its vote log in data/donor-meta/<attr>/consensus_state.jsonl,
+which doubles as the answer cache between runs.
+The values are either the distinct values of donor_meta_all_info written by 5-1-donor-run.py
+(--from-db) or each attribute's round-1 CSV. Writes data/donor-meta/<attr>/<attr>_with_tags.csv
+like 3-final-merge.py.
+    python src/process-donor/run-consensus.py
+    python src/process-donor/run-consensus.py --attr bmi --attr sex
+    python src/process-donor/run-consensus.py --from-db --backend sqlite --sqlite-path hra_rag_ftu.sqlite
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [HERE, os.path.join(HERE, '..', 'lm-rag')]
+from batch_classify import classify_batched
+from consensus import ConsensusEngine
+from donor_attributes import ATTRIBUTES, ip_port_list
+from donor_rules import pre_classify
+from storage import add_storage_args, open_storage_from_args
+
+DONOR_TABLE = 'donor_meta_all_info'
+
+
+def read_csv_values(spec):
+    df = pd.read_csv(os.path.join('data', 'donor-meta', spec.name, spec.input_name), encoding='latin1')
+    if spec.column not in df.columns:
+        raise SystemExit(f"{spec.input_name} must have a '{spec.column}' column.")
+    return df
+
+
+def read_db_values(args, specs):
+    """Distinct values of every selected attribute, from one pass over donor_meta_all_info."""
+    store = open_storage_from_args(args)
+    sources = sorted({spec.source for spec in specs})
+    seen = {source: {} for source in sources}
+    for row in store.select(DONOR_TABLE, sources, final=False, as_dict=False):
+        for source, value in zip(sources, row):
+            seen[source][str(value)] = None
+    store.close()
+    return {spec.name: pd.DataFrame({spec.column: list(seen[spec.source])}) for spec in specs}
+
+
+def classify_attribute(spec, df, pool, args, endpoints):
+    values = list(dict.fromkeys(df[spec.column].astype(str)))
+    print(f"{spec.name}: {len(values)} distinct values")
+    resolved = pre_classify(values, spec.rule, spec.name)[0] if spec.rule else []
+
+    def classify(batch):
+        return classify_batched(batch, spec.instructions, spec.categories, endpoints, k=len(batch))
+
+    data_dir = os.path.join('data', 'donor-meta', spec.name)
+    engine = ConsensusEngine(classify, os.path.join(data_dir, 'consensus_state.jsonl'),
+                             agree=args.agree, max_rounds=args.max_rounds, batch_size=args.batch_k,
+                             name=spec.name)
+    labels = engine.run(values, settled=dict(resolved), pool=pool)
+
+    # Same layout as 3-final-merge.py: the label list, or 'others' without agreement
+    df = df.copy()
+    df['tag'] = [str(labels[v]) if labels[v] else 'others' for v in df[spec.column].astype(str)]
+    output_csv = os.path.join(data_dir, f'{spec.name}_with_tags.csv')
+    df.to_csv(output_csv, index=False)
+    print(f"Saved {output_csv}")
+
+
+def main(args):
+    specs = [ATTRIBUTES[name] for name in dict.fromkeys(args.attr or ATTRIBUTES)]
+    endpoints = args.ip_port or ip_port_list
+    frames = read_db_values(args, specs) if args.from_db else {s.name: read_csv_values(s) for s in specs}
+
+    # One request pool for all attributes; each attribute runs its rounds in its own thread
+    with ThreadPoolExecutor(args.workers or 2 * len(endpoints)) as pool, \
+            ThreadPoolExecutor(len(specs)) as runners:
+        jobs = [runners.submit(classify_attribute, spec, frames[spec.name], pool, args, endpoints)
+                for spec in specs]
+        for job in jobs:
+            job.result()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Classify donor attributes to multi-round consensus')
+    parser.add_argument('--attr', action='append', choices=sorted(ATTRIBUTES),
+                        help='Attribute to classify; repeat for several (default: all)')
+    parser.add_argument('--from-db', action='store_true',
+                        help=f'Read distinct values from {DONOR_TABLE} instead of the round-1 CSVs')
+    parser.add_argument('--agree', type=int, default=2, help='Matching answers that settle a value')
+    parser.add_argument('--max-rounds', type=int, default=5, help='Answers per value before giving up')
+    parser.add_argument('--batch-k', type=int, default=20, help='Values per LLM request')
+    parser.add_argument('--workers', type=int, help='Requests in flight (default: 2 per endpoint)')
+    parser.add_argument('--ip-port', action='append', help='Ollama endpoint; repeat for several')
+    add_storage_args(parser)
+    main(parser.parse_args())